@@ -0,0 +1,121 @@
+"""
+Benchmark the torch and ONNX embedding backends against each other.
+
+Reports encode throughput for each backend and how closely the ONNX/int8
+vectors agree with the torch reference: mean cosine similarity between the
+two vectors of the same text, and top-k retrieval overlap for a set of
+queries over the same corpus.
+
+Usage (from the backend directory):
+    python benchmarks/bench_embedding_backends.py --backends torch onnx onnx-int8 --batch-size 64
+    python benchmarks/bench_embedding_backends.py --corpus documents/notes.txt
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_service import DEFAULT_EMBEDDING_MODEL, build_embeddings
+
+SAMPLE_QUERIES = [
+    "What is the OSI model?",
+    "Explain the difference between TCP and UDP",
+    "How does virtual memory work?",
+    "What is normalization in databases?",
+    "Define a deadlock and its conditions",
+    "What are the phases of the software development life cycle?",
+    "How does a transistor amplify a signal?",
+    "What is the purpose of a subnet mask?",
+]
+
+SAMPLE_SENTENCES = [
+    "The {topic} is a fundamental concept that students must understand before moving on.",
+    "In practice, {topic} is applied in many real-world systems and case studies.",
+    "A common exam question asks how {topic} differs from related ideas.",
+    "The main advantage of {topic} is efficiency, while its limitation is complexity.",
+]
+
+SAMPLE_TOPICS = [
+    "OSI model", "TCP handshake", "UDP datagram", "virtual memory", "page table",
+    "database normalization", "primary key", "deadlock", "semaphore", "subnet mask",
+    "waterfall model", "agile sprint", "transistor", "operational amplifier", "heat transfer",
+]
+
+def build_corpus(path=None, size=2000):
+    """Load text chunks from a file, or generate a synthetic study corpus."""
+    if path:
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            text = f.read()
+        chunks = [text[i:i + 1000] for i in range(0, len(text), 800) if text[i:i + 1000].strip()]
+        return chunks[:size]
+
+    chunks = []
+    for i in range(size):
+        topic = SAMPLE_TOPICS[i % len(SAMPLE_TOPICS)]
+        sentences = [template.format(topic=topic) for template in SAMPLE_SENTENCES]
+        chunks.append(f"Section {i}. " + " ".join(sentences[i % 4:] + sentences[:i % 4]))
+    return chunks
+
+def normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+def run_backend(backend, corpus, queries, batch_size, model_name):
+    """Encode the corpus and queries with one backend and time the corpus encode."""
+    load_start = time.perf_counter()
+    embeddings = build_embeddings(model_name, backend, batch_size=batch_size)
+    embeddings.embed_documents(corpus[:8])  # warm-up
+    load_time = time.perf_counter() - load_start
+
+    start = time.perf_counter()
+    doc_vectors = normalize(embeddings.embed_documents(corpus))
+    encode_time = time.perf_counter() - start
+    query_vectors = normalize([embeddings.embed_query(q) for q in queries])
+
+    return {
+        "backend": backend,
+        "load_seconds": load_time,
+        "encode_seconds": encode_time,
+        "chunks_per_second": len(corpus) / encode_time if encode_time else float("inf"),
+        "doc_vectors": doc_vectors,
+        "query_vectors": query_vectors,
+    }
+
+def top_k(query_vectors, doc_vectors, k):
+    scores = query_vectors @ doc_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx-int8"])
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--corpus", help="Text file to chunk instead of the synthetic corpus")
+    parser.add_argument("--size", type=int, default=2000, help="Number of chunks to encode")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.corpus, args.size)
+    print(f"Corpus: {len(corpus)} chunks, batch size {args.batch_size}, model {args.model}\n")
+
+    results = [run_backend(b, corpus, SAMPLE_QUERIES, args.batch_size, args.model) for b in args.backends]
+    reference = results[0]
+    reference_top = top_k(reference["query_vectors"], reference["doc_vectors"], args.k)
+
+    print(f"{'backend':<12}{'load s':>9}{'encode s':>10}{'chunks/s':>10}{'cosine':>9}{f'top-{args.k} overlap':>16}")
+    for result in results:
+        cosine = float(np.mean(np.sum(result["doc_vectors"] * reference["doc_vectors"], axis=1)))
+        result_top = top_k(result["query_vectors"], result["doc_vectors"], args.k)
+        overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(reference_top, result_top)])
+        print(f"{result['backend']:<12}{result['load_seconds']:>9.2f}{result['encode_seconds']:>10.2f}"
+              f"{result['chunks_per_second']:>10.1f}{cosine:>9.4f}{overlap:>16.2%}")
+
+    print(f"\nCosine and overlap are measured against the '{reference['backend']}' backend.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Ingestion benchmark suite.
+
+Generates synthetic TXT and PDF study documents of 10/100/1000 pages, runs
+them through ingestion and reports wall time, memory (peak RSS, and how far
+it rose above the RSS at the start of the stage) and chunks/sec for each
+stage (load, split, embed, persist), plus an end-to-end run of the pipelined
+ingestion used by /upload. Results are written as JSON so runs from
+different commits can be compared.
+
+Embeddings never touch the server's embedding cache: by default every run
+calls the model, and --use-cache embeds through a cache private to the run.
+
+Usage (from the backend directory):
+    python benchmarks/bench_ingestion.py --output bench_results.json
+    python benchmarks/bench_ingestion.py --pages 10 100 --formats txt
+    python benchmarks/bench_ingestion.py --output new.json --compare old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_chroma import Chroma
+
+from embedding_service import CachedEmbeddings, get_embeddings
+from ingest_pipeline import IngestPipeline, add_embedded_documents
+from rag import INGEST_BATCH_SIZE, get_text_splitter, load_documents, split_documents
+
+STAGES = ("load", "split", "embed", "persist")
+
+TOPICS = [
+    "the OSI model", "TCP congestion control", "virtual memory", "process scheduling",
+    "database normalization", "B-tree indexes", "the waterfall model", "unit testing",
+    "Ohm's law", "operational amplifiers", "heat transfer", "fluid mechanics",
+]
+
+LINES_PER_PAGE = 40
+
+# -- synthetic documents ------------------------------------------------------
+
+def synthetic_line(page, line):
+    topic = TOPICS[(page + line) % len(TOPICS)]
+    return (f"Page {page + 1}, point {line + 1}: {topic.capitalize()} is an important concept; "
+            f"students should know how {topic} works and why it matters.")
+
+def write_synthetic_txt(path, pages):
+    with open(path, "w", encoding="utf-8") as f:
+        for page in range(pages):
+            f.write(f"Chapter {page + 1}\n")
+            for line in range(LINES_PER_PAGE):
+                f.write(synthetic_line(page, line) + "\n")
+            f.write("\n")
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_synthetic_pdf(path, pages):
+    """Write a minimal multi-page PDF with real text content (no extra dependencies)."""
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>",
+               3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    page_ids = []
+    next_id = 4
+    for page in range(pages):
+        lines = [f"Chapter {page + 1}"] + [synthetic_line(page, line) for line in range(LINES_PER_PAGE)]
+        stream = "BT /F1 8 Tf 36 800 Td 10 TL " + " ".join(f"({_pdf_escape(l)}) Tj T*" for l in lines) + " ET"
+        stream_bytes = stream.encode("latin-1")
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream_bytes) + stream_bytes + b"\nendstream"
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(page_id)
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[2] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for object_id in sorted(objects):
+            offsets[object_id] = f.tell()
+            f.write(b"%d 0 obj\n" % object_id + objects[object_id] + b"\nendobj\n")
+        xref_offset = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for object_id in sorted(objects):
+            f.write(b"%010d 00000 n \n" % offsets[object_id])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+
+# -- measurement ----------------------------------------------------------------
+
+def current_rss_bytes():
+    """Resident set size of this process, or None if it cannot be measured."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class RssSampler:
+    """Sample RSS in a background thread and remember the starting value and the peak."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = None
+        self.peak = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss is not None:
+            self.peak = max(self.peak or 0, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start = current_rss_bytes()
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+def measure(func, *args):
+    """Run ``func`` and return ``(result, wall_seconds, memory)``.
+
+    ``memory`` holds the absolute peak RSS and the peak minus the RSS when the
+    call started, which is what the call itself cost (the process RSS barely
+    drops between stages).
+    """
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        result = func(*args)
+        wall = time.perf_counter() - start
+    memory = {"peak_rss_mb": None, "rss_growth_mb": None}
+    if sampler.peak:
+        memory["peak_rss_mb"] = round(sampler.peak / (1024 * 1024), 1)
+        if sampler.start:
+            memory["rss_growth_mb"] = round(max(0, sampler.peak - sampler.start) / (1024 * 1024), 1)
+    return result, wall, memory
+
+# -- benchmark runs ---------------------------------------------------------------
+
+def stage_result(wall, memory, chunks):
+    return {
+        "wall_seconds": round(wall, 4),
+        **memory,
+        "chunks_per_second": round(chunks / wall, 1) if wall > 0 else None,
+    }
+
+def run_staged(file_path, work_dir, embedder):
+    """Run each stage on its own so its time and memory are isolated."""
+    results = {}
+
+    pages, wall, memory = measure(load_documents, [file_path])
+    load_wall, load_memory = wall, memory
+
+    chunks, wall, memory = measure(split_documents, pages)
+    results["load"] = stage_result(load_wall, load_memory, len(chunks))
+    results["split"] = stage_result(wall, memory, len(chunks))
+
+    texts = [chunk.page_content for chunk in chunks]
+
+    def embed_all():
+        vectors = []
+        for start in range(0, len(texts), INGEST_BATCH_SIZE):
+            vectors.extend(embedder.embed_documents(texts[start:start + INGEST_BATCH_SIZE]))
+        return vectors
+
+    vectors, wall, memory = measure(embed_all)
+    results["embed"] = stage_result(wall, memory, len(chunks))
+
+    store_dir = tempfile.mkdtemp(dir=work_dir, prefix="chroma-")
+    db = Chroma(collection_name="bench", persist_directory=store_dir, embedding_function=embedder)
+    ids = [f"bench:{index}" for index in range(len(chunks))]
+
+    def persist_all():
+        # Writes the embed stage's vectors, as the ingestion pipeline does
+        for start in range(0, len(chunks), INGEST_BATCH_SIZE):
+            end = start + INGEST_BATCH_SIZE
+            add_embedded_documents(db, chunks[start:end], vectors[start:end], ids[start:end])
+
+    _, wall, memory = measure(persist_all)
+    results["persist"] = stage_result(wall, memory, len(chunks))
+    return len(pages), len(chunks), results
+
+def run_pipelined(file_path, work_dir, embedder):
+    """Run the pipelined ingestion used by /upload end to end."""
+    store_dir = tempfile.mkdtemp(dir=work_dir, prefix="chroma-")
+    # The pipeline writes its own vectors, so Chroma's embedding function is never called here
+    db = Chroma(collection_name="bench", persist_directory=store_dir, embedding_function=embedder)
+    pipeline = IngestPipeline(db, embedder, get_text_splitter(), batch_size=INGEST_BATCH_SIZE)
+    chunk_count, wall, memory = measure(pipeline.run, file_path, "bench", os.path.basename(file_path))
+    return {
+        "wall_seconds": round(wall, 4),
+        **memory,
+        "chunks": chunk_count,
+        "chunks_per_second": round(chunk_count / wall, 1) if wall > 0 else None,
+        "first_chunk_seconds": round(pipeline.first_chunk_seconds, 4) if pipeline.first_chunk_seconds else None,
+        "stage_busy_seconds": {stage: round(seconds, 4) for stage, seconds in pipeline.stage_seconds.items()},
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def compare(results, baseline_path):
+    """Print per-stage wall time changes against an earlier results file."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    old_runs = {(run["format"], run["pages"]): run for run in baseline.get("runs", [])}
+    print(f"\nComparison against {baseline_path} (commit {baseline.get('commit')}):")
+    for run in results["runs"]:
+        old = old_runs.get((run["format"], run["pages"]))
+        if not old:
+            continue
+        changes = []
+        for stage in STAGES:
+            before, after = old["stages"][stage]["wall_seconds"], run["stages"][stage]["wall_seconds"]
+            if before:
+                changes.append(f"{stage} {100 * (after - before) / before:+.0f}%")
+        print(f"  {run['format']:>3} {run['pages']:>5} pages: " + ", ".join(changes))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", nargs="+", type=int, default=[10, 100, 1000])
+    parser.add_argument("--formats", nargs="+", choices=["txt", "pdf"], default=["txt", "pdf"])
+    parser.add_argument("--use-cache", action="store_true",
+                        help="Embed through an embedding cache private to this run; the pipelined run "
+                             "then re-embeds cached chunks (measures warm re-uploads)")
+    parser.add_argument("--skip-pipeline", action="store_true", help="Only run the per-stage measurements")
+    parser.add_argument("--output", default="bench_ingestion.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    # Load the model before timing anything
+    get_embeddings().embed_documents(["warm-up"])
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "batch_size": INGEST_BATCH_SIZE,
+        "use_cache": args.use_cache,
+        "runs": [],
+    }
+
+    work_dir = tempfile.mkdtemp(prefix="edufy-bench-")
+    # Never the server's cache: repeated runs of the deterministic documents
+    # would otherwise measure cache hits and fill it with synthetic chunks
+    if args.use_cache:
+        embedder = CachedEmbeddings(cache_path=os.path.join(work_dir, "embedding_cache.sqlite3"))
+    else:
+        embedder = get_embeddings()
+    try:
+        for file_format in args.formats:
+            for pages in args.pages:
+                file_path = os.path.join(work_dir, f"synthetic_{pages}.{file_format}")
+                (write_synthetic_pdf if file_format == "pdf" else write_synthetic_txt)(file_path, pages)
+
+                page_count, chunk_count, stages = run_staged(file_path, work_dir, embedder)
+                run = {
+                    "format": file_format,
+                    "pages": pages,
+                    "file_bytes": os.path.getsize(file_path),
+                    "loaded_pages": page_count,
+                    "chunks": chunk_count,
+                    "stages": stages,
+                }
+                if not args.skip_pipeline:
+                    run["pipelined"] = run_pipelined(file_path, work_dir, embedder)
+                results["runs"].append(run)
+
+                print(f"{file_format:>3} {pages:>5} pages, {chunk_count:>6} chunks | " + " | ".join(
+                    f"{stage} {stages[stage]['wall_seconds']:.2f}s/+{stages[stage]['rss_growth_mb']}MB"
+                    for stage in STAGES
+                ) + (f" | pipelined {run['pipelined']['wall_seconds']:.2f}s" if "pipelined" in run else ""))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
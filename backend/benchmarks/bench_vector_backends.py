@@ -0,0 +1,146 @@
+"""
+Benchmark the Chroma and in-memory NumPy vector store backends.
+
+Builds both stores over the same synthetic, clustered embeddings (so no
+model is needed) and reports per-query latency (p50/p95) and recall@k
+against brute-force exact search, for several corpus sizes. Chroma's HNSW
+index is approximate; the NumPy store is exact, so its recall should be 1.0.
+
+Usage (from the backend directory):
+    python benchmarks/bench_vector_backends.py --sizes 1000 10000 50000 --k 10
+    python benchmarks/bench_vector_backends.py --filter-docs 3
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+
+from numpy_store import NumpyVectorStore, normalize_rows
+
+class VectorLookupEmbeddings(Embeddings):
+    """Returns pre-generated vectors for known texts (the chunk ids used below)."""
+
+    def __init__(self, vectors_by_text):
+        self.vectors_by_text = vectors_by_text
+
+    def embed_documents(self, texts):
+        return [self.vectors_by_text[text].tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors_by_text[text].tolist()
+
+def synthetic_vectors(count, dim, clusters, rng):
+    """Unit vectors scattered around ``clusters`` topic centres, like real chunk embeddings."""
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, size=count)
+    vectors = centres[assignment] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    return normalize_rows(vectors)
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+def exact_top_k(vectors, doc_ids, query, k, allowed_docs=None):
+    scores = vectors @ query
+    if allowed_docs is not None:
+        scores = np.where(np.isin(doc_ids, list(allowed_docs)), scores, -np.inf)
+    return set(np.argsort(-scores)[:k].tolist())
+
+def build_filter(allowed_docs):
+    if allowed_docs is None:
+        return None
+    return {"doc_id": {"$in": sorted(allowed_docs)}}
+
+def run_size(size, dim, k, query_count, filter_docs, batch_size, rng):
+    vectors = synthetic_vectors(size, dim, clusters=max(8, size // 200), rng=rng)
+    queries = synthetic_vectors(query_count, dim, clusters=8, rng=rng)
+    doc_count = max(1, size // 100)
+    doc_ids = np.array([f"doc{i % doc_count}" for i in range(size)])
+    ids = [f"chunk{i}" for i in range(size)]
+    metadatas = [{"doc_id": doc_id, "chunk_id": chunk_id} for doc_id, chunk_id in zip(doc_ids.tolist(), ids)]
+    embeddings = VectorLookupEmbeddings(dict(zip(ids, vectors)))
+
+    allowed = None
+    if filter_docs:
+        allowed = set(rng.choice(np.unique(doc_ids), size=min(filter_docs, doc_count), replace=False).tolist())
+    search_filter = build_filter(allowed)
+    truth = [exact_top_k(vectors, doc_ids, query, k, allowed) for query in queries]
+    row_of = {chunk_id: row for row, chunk_id in enumerate(ids)}
+
+    results = {"size": size, "dim": dim, "k": k, "queries": query_count, "filter_docs": len(allowed or ())}
+    work_dir = tempfile.mkdtemp(prefix="edufy_vector_bench_")
+    try:
+        stores = {}
+        start = time.perf_counter()
+        numpy_db = NumpyVectorStore(embeddings, persist_directory=os.path.join(work_dir, "numpy"))
+        for offset in range(0, size, batch_size):
+            batch = slice(offset, offset + batch_size)
+            numpy_db.add_embeddings(ids[batch], vectors[batch], metadatas[batch], ids[batch])
+        stores["numpy"] = (numpy_db, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        chroma_db = Chroma(
+            collection_name="bench",
+            persist_directory=os.path.join(work_dir, "chroma"),
+            embedding_function=embeddings,
+            collection_metadata={"hnsw:space": "cosine"},
+        )
+        for offset in range(0, size, batch_size):
+            batch = slice(offset, offset + batch_size)
+            chroma_db.add_texts(ids[batch], metadatas=metadatas[batch], ids=ids[batch])
+        stores["chroma"] = (chroma_db, time.perf_counter() - start)
+
+        for name, (db, build_seconds) in stores.items():
+            latencies, hits = [], 0
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                docs = db.similarity_search_by_vector(query.tolist(), k=k, filter=search_filter)
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected & {row_of[doc.metadata["chunk_id"]] for doc in docs})
+            results[name] = {
+                "build_seconds": round(build_seconds, 3),
+                "p50_ms": percentile_ms(latencies, 50),
+                "p95_ms": percentile_ms(latencies, 95),
+                f"recall@{k}": round(hits / max(1, sum(len(expected) for expected in truth)), 4),
+            }
+            print(f"  {name:>6}: build {build_seconds:7.2f}s  p50 {results[name]['p50_ms']:8.3f} ms  "
+                  f"p95 {results[name]['p95_ms']:8.3f} ms  recall@{k} {results[name][f'recall@{k}']:.4f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 50000])
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (all-MiniLM-L6-v2 uses 384)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--filter-docs", type=int, default=0,
+                        help="Restrict queries to this many documents (doc_id $in filter)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_vector_backends.json")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    all_results = []
+    for size in args.sizes:
+        print(f"\n=== {size} chunks ===")
+        all_results.append(run_size(size, args.dim, args.k, args.queries, args.filter_docs, args.batch_size, rng))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(all_results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Keyword (BM25) inverted index over a corpus' chunks.
+Built while documents are ingested and stored next to the vector store, so
+hybrid retrieval can match exact terms ("subnet mask", "TCP") that sentence
+embeddings tend to blur. Only term statistics are kept here; chunk text is
+read back from the vector store by chunk id.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+# Standard Okapi BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_][a-z0-9]+)*")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "in", "is", "it", "its", "of", "on", "or", "that", "the", "this", "to",
+    "what", "when", "where", "which", "who", "why", "with", "define", "explain", "describe",
+}
+
+def tokenize(text):
+    """Lower-case word tokens without stopwords."""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """Inverted index (term → {chunk_id: term frequency}) with BM25 scoring."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._chunks = {}  # chunk_id -> (doc_id, length, {term: tf})
+        self._postings = defaultdict(dict)
+        self._total_length = 0
+
+    def _index_chunk(self, chunk_id, doc_id, length, term_counts):
+        self._chunks[chunk_id] = (doc_id, length, term_counts)
+        self._total_length += length
+        for term, count in term_counts.items():
+            self._postings[term][chunk_id] = count
+
+    def _unindex_chunk(self, chunk_id):
+        _, length, term_counts = self._chunks.pop(chunk_id)
+        self._total_length -= length
+        for term in term_counts:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _ensure_loaded(self):
+        """Load the index from disk on first use (lock held)."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            for chunk_id, (doc_id, length, term_counts) in stored.items():
+                self._index_chunk(chunk_id, doc_id, length, term_counts)
+        except Exception as e:
+            print(f"⚠️ Could not read keyword index, hybrid search will use vectors only: {e}")
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({chunk_id: list(entry) for chunk_id, entry in self._chunks.items()}, f)
+        os.replace(temp_path, self.path)
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._chunks)
+
+    def add_documents(self, docs):
+        """Index chunks tagged with ``chunk_id``/``doc_id`` metadata (kept in memory until ``save``)."""
+        with self._lock:
+            self._ensure_loaded()
+            for doc in docs:
+                chunk_id = doc.metadata.get("chunk_id")
+                if not chunk_id:
+                    continue
+                if chunk_id in self._chunks:
+                    self._unindex_chunk(chunk_id)
+                tokens = tokenize(doc.page_content)
+                self._index_chunk(chunk_id, doc.metadata.get("doc_id"), len(tokens), dict(Counter(tokens)))
+
+    def remove_document(self, doc_id):
+        """Drop every chunk of ``doc_id``."""
+        with self._lock:
+            self._ensure_loaded()
+            for chunk_id in [cid for cid, entry in self._chunks.items() if entry[0] == doc_id]:
+                self._unindex_chunk(chunk_id)
+
+    def clear(self):
+        with self._lock:
+            self._chunks.clear()
+            self._postings.clear()
+            self._total_length = 0
+            self._loaded = True
+
+    def save(self):
+        with self._lock:
+            self._ensure_loaded()
+            self._save()
+
+    def search(self, query, k=10, doc_ids=None):
+        """Return up to ``k`` ``(chunk_id, score)`` pairs, best first."""
+        terms = set(tokenize(query))
+        allowed = set(doc_ids) if doc_ids else None
+        with self._lock:
+            self._ensure_loaded()
+            chunk_total = len(self._chunks)
+            if not chunk_total or not terms:
+                return []
+            average_length = self._total_length / chunk_total or 1.0
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (chunk_total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    doc_id, length, _ = self._chunks[chunk_id]
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    scores[chunk_id] += idf * tf * (BM25_K1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
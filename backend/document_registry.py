@@ -0,0 +1,118 @@
+"""
+Registry of documents in a persistent corpus.
+Keeps one entry per ingested document (id, filename, size, chunk count) in a
+small JSON file next to the vector store. Entries and chunk totals are held
+in memory once loaded, so retrieval can size its searches in O(1).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "documents.json")
+
+class DocumentRegistry:
+    """JSON-file backed registry of the documents in one corpus."""
+
+    def __init__(self, path=DEFAULT_REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+        self._total_chunks = 0
+
+    def _read(self):
+        """Return the in-memory registry, loading it from disk on first use."""
+        if self._entries is None:
+            entries = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        entries = json.load(f)
+                except Exception as e:
+                    print(f"⚠️ Could not read document registry: {e}")
+            self._entries = entries
+            self._total_chunks = sum(entry.get("chunks", 0) for entry in entries.values())
+        return self._entries
+
+    def _write(self, registry):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(registry, f, indent=2)
+        os.replace(temp_path, self.path)
+        self._entries = registry
+        self._total_chunks = sum(entry.get("chunks", 0) for entry in registry.values())
+
+    def list_documents(self):
+        """Return all registered documents, oldest upload first."""
+        with self._lock:
+            registry = self._read()
+        return sorted(registry.values(), key=lambda entry: entry.get("uploaded_at", 0))
+
+    def get_document(self, doc_id):
+        """Return the registry entry for a document, or None."""
+        with self._lock:
+            return self._read().get(doc_id)
+
+    def total_chunks(self):
+        """Exact number of chunks across all documents."""
+        with self._lock:
+            self._read()
+            return self._total_chunks
+
+    def chunk_count(self, doc_ids=None):
+        """Exact number of chunks in ``doc_ids`` (or the whole corpus)."""
+        if not doc_ids:
+            return self.total_chunks()
+        with self._lock:
+            registry = self._read()
+            return sum(registry.get(doc_id, {}).get("chunks", 0) for doc_id in set(doc_ids))
+
+    def version(self):
+        """Digest of the documents (id and content hash) currently registered.
+
+        Anything derived from the whole corpus (study material, cached answers)
+        is tagged with this and becomes stale when it changes.
+        """
+        entries = sorted(f"{entry['doc_id']}:{entry.get('sha256', '')}" for entry in self.list_documents())
+        return hashlib.sha256("\n".join(entries).encode("utf-8")).hexdigest()[:16]
+
+    def find_document_by_filename(self, filename):
+        """Return the registry entry whose file has the given name, or None."""
+        for entry in self.list_documents():
+            if entry.get("filename") == filename:
+                return entry
+        return None
+
+    def register_document(self, doc_id, filename, file_path, file_size, sha256, chunk_count):
+        """Add or replace a document entry."""
+        entry = {
+            "doc_id": doc_id,
+            "filename": filename,
+            "path": file_path,
+            "size": file_size,
+            "sha256": sha256,
+            "chunks": chunk_count,
+            "uploaded_at": time.time(),
+        }
+        with self._lock:
+            registry = dict(self._read())
+            registry[doc_id] = entry
+            self._write(registry)
+        return entry
+
+    def unregister_document(self, doc_id):
+        """Remove a document entry, returning it (or None if it was not registered)."""
+        with self._lock:
+            registry = dict(self._read())
+            entry = registry.pop(doc_id, None)
+            if entry is not None:
+                self._write(registry)
+        return entry
+
+    def clear(self):
+        """Forget every registered document."""
+        with self._lock:
+            self._write({})
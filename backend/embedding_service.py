@@ -0,0 +1,322 @@
+"""
+Shared embedding model service.
+Loads the sentence-transformers model once per process so that ingestion,
+retrieval and every other caller reuse the same instance.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_MODEL_NAME = os.environ.get("EDUFY_EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+# "torch" (sentence-transformers on PyTorch), "onnx" (ONNX Runtime, fp32) or
+# "onnx-int8" (ONNX Runtime with a dynamically quantized int8 model)
+EMBEDDING_BACKEND = os.environ.get("EDUFY_EMBEDDING_BACKEND", "torch")
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EDUFY_EMBEDDING_BATCH_SIZE", "32"))
+# Quantized export shipped in the model repo; pick the variant matching the CPU
+# (model_qint8_avx512_vnni.onnx, model_qint8_avx512.onnx, model_qint8_arm64.onnx)
+ONNX_INT8_FILE = os.environ.get("EDUFY_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+# Query text → vector entries kept in memory for repeated and canned queries
+QUERY_CACHE_SIZE = int(os.environ.get("EDUFY_QUERY_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "embedding_cache.sqlite3")
+# Chunk vectors kept on disk; the least recently used are evicted beyond this
+# (about 1.5 KB each for a 384-dimensional model)
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EDUFY_EMBEDDING_CACHE_SIZE", "100000"))
+
+# Process-wide embedding model and the name/backend it was loaded with
+_embeddings = None
+_embeddings_model_name = None
+_embeddings_backend = None
+_embeddings_lock = threading.Lock()
+
+def build_embeddings(model_name, backend="torch", batch_size=EMBEDDING_BATCH_SIZE):
+    """Construct a HuggingFaceEmbeddings for the given backend.
+
+    The ONNX backends need ``sentence-transformers[onnx]`` (ONNX Runtime via
+    optimum); sentence-transformers exports/loads the ONNX graph itself.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose one of: {', '.join(EMBEDDING_BACKENDS)}")
+
+    model_kwargs = {}
+    if backend == "onnx":
+        model_kwargs = {"backend": "onnx"}
+    elif backend == "onnx-int8":
+        model_kwargs = {"backend": "onnx", "model_kwargs": {"file_name": ONNX_INT8_FILE}}
+
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": batch_size},
+    )
+
+def _load_embeddings(model_name, backend):
+    """Construct the embedding model (slow: downloads/loads weights)."""
+    print(f"🧠 Loading embedding model: {model_name} ({backend} backend)")
+    start_time = time.time()
+    embeddings = build_embeddings(model_name, backend)
+    print(f"✓ Embedding model loaded in {time.time() - start_time:.1f}s")
+    return embeddings
+
+def get_embeddings():
+    """Return the shared embedding model, loading it on first use."""
+    global _embeddings, _embeddings_model_name, _embeddings_backend
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _embeddings = _load_embeddings(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND)
+                _embeddings_model_name = EMBEDDING_MODEL_NAME
+                _embeddings_backend = EMBEDDING_BACKEND
+    return _embeddings
+
+def get_embedding_model_name():
+    """Return the name of the currently active embedding model."""
+    return _embeddings_model_name or EMBEDDING_MODEL_NAME
+
+def get_embedding_identity():
+    """Identify the model *and* backend, since quantized vectors differ slightly from torch ones."""
+    backend = _embeddings_backend or EMBEDDING_BACKEND
+    model_name = get_embedding_model_name()
+    return model_name if backend == "torch" else f"{model_name}#{backend}"
+
+def reload_embeddings(model_name, backend=None):
+    """Switch the shared embedding model, reloading only if the name or backend changed."""
+    global _embeddings, _embeddings_model_name, _embeddings_backend, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND
+    backend = backend or EMBEDDING_BACKEND
+    with _embeddings_lock:
+        if _embeddings is not None and _embeddings_model_name == model_name and _embeddings_backend == backend:
+            return _embeddings
+        _embeddings = _load_embeddings(model_name, backend)
+        _embeddings_model_name = model_name
+        _embeddings_backend = backend
+        EMBEDDING_MODEL_NAME = model_name
+        EMBEDDING_BACKEND = backend
+    return _embeddings
+
+def warm_up_embeddings():
+    """Load the model and run one encode so the first real request is fast."""
+    try:
+        embeddings = get_embeddings()
+        start_time = time.time()
+        embeddings.embed_documents(["Edufy embedding warm-up sentence."])
+        print(f"🔥 Embedding model warmed up in {time.time() - start_time:.2f}s")
+        return True
+    except Exception as e:
+        print(f"⚠️ Embedding warm-up failed: {e}")
+        return False
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that reuses vectors from a persistent, content-addressed cache.
+
+    Each chunk is keyed by a SHA-256 of the model identity plus the chunk text, so
+    re-uploading the same (or a lightly edited) document only embeds the chunks
+    that are genuinely new. The cache lives outside the Chroma directory and
+    survives ``clear_vector_store()``; once it holds ``max_entries`` vectors
+    the least recently used ones are evicted.
+
+    Query embeddings are kept separately in a bounded in-memory LRU, since
+    students repeat questions and the app itself issues fixed retrieval strings.
+    """
+
+    def __init__(self, cache_path=None, query_cache_size=QUERY_CACHE_SIZE, max_entries=EMBEDDING_CACHE_SIZE):
+        self.cache_path = cache_path or EMBEDDING_CACHE_PATH
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = None
+        self.documents_reused = 0
+        self.documents_embedded = 0
+        self.query_cache_size = query_cache_size
+        self._query_cache = OrderedDict()
+        self._query_lock = threading.Lock()
+        self.query_hits = 0
+        self.query_misses = 0
+
+    def _get_connection(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            self._connection = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(embeddings)")]
+            if "last_used" not in columns:
+                # Caches written before eviction existed: their entries go first
+                self._connection.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._connection.commit()
+        return self._connection
+
+    @staticmethod
+    def cache_key(text, model_name):
+        """Stable digest of (model name, chunk text)."""
+        return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            connection = self._get_connection()
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                hit_keys = list(found)
+                now = time.time()
+                for start in range(0, len(hit_keys), 500):
+                    batch = hit_keys[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    connection.execute(f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})", [now, *batch])
+                connection.commit()
+        return found
+
+    def _store(self, items):
+        """Insert vectors, then trim the least recently used entries to ``max_entries``."""
+        now = time.time()
+        with self._lock:
+            connection = self._get_connection()
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items],
+            )
+            (size,) = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if size > self.max_entries:
+                connection.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (size - self.max_entries,),
+                )
+            connection.commit()
+
+    def embed_documents(self, texts):
+        """Embed texts, calling the model only for cache misses."""
+        texts = list(texts)
+        if not texts:
+            return []
+        model_identity = get_embedding_identity()
+        keys = [self.cache_key(text, model_identity) for text in texts]
+
+        try:
+            cached = self._lookup(list(set(keys)))
+        except Exception as e:
+            print(f"⚠️ Embedding cache unavailable, embedding everything: {e}")
+            cached = {}
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            new_vectors = get_embeddings().embed_documents(list(missing.values()))
+            new_items = list(zip(missing.keys(), new_vectors))
+            cached.update(new_items)
+            try:
+                self._store(new_items)
+            except Exception as e:
+                print(f"⚠️ Could not write embedding cache: {e}")
+
+        with self._lock:
+            self.documents_reused += len(texts) - len(missing)
+            self.documents_embedded += len(missing)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text):
+        """Embed a query, reusing the vector if the same text was asked recently."""
+        key = (get_embedding_identity(), text)
+        with self._query_lock:
+            vector = self._query_cache.get(key)
+            if vector is not None:
+                self._query_cache.move_to_end(key)
+                self.query_hits += 1
+                return list(vector)
+            self.query_misses += 1
+
+        vector = tuple(get_embeddings().embed_query(text))
+        with self._query_lock:
+            self._query_cache[key] = vector
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+        return list(vector)
+
+    def embed_queries(self, texts):
+        """Embed several queries at once: LRU hits are reused, misses go to the model in one batch."""
+        texts = list(texts)
+        identity = get_embedding_identity()
+        vectors = {}
+        with self._query_lock:
+            for text in texts:
+                vector = self._query_cache.get((identity, text))
+                if vector is not None:
+                    self._query_cache.move_to_end((identity, text))
+                    self.query_hits += 1
+                    vectors[text] = vector
+            missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+            self.query_misses += len(missing)
+
+        if missing:
+            new_vectors = get_embeddings().embed_documents(missing)
+            with self._query_lock:
+                for text, vector in zip(missing, new_vectors):
+                    vector = tuple(vector)
+                    vectors[text] = vector
+                    self._query_cache[(identity, text)] = vector
+                    self._query_cache.move_to_end((identity, text))
+                while len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+        return [list(vectors[text]) for text in texts]
+
+    def query_cache_stats(self):
+        """Hit/miss counters and current size of the query-embedding LRU."""
+        with self._query_lock:
+            lookups = self.query_hits + self.query_misses
+            return {
+                "hits": self.query_hits,
+                "misses": self.query_misses,
+                "hit_rate": round(self.query_hits / lookups, 3) if lookups else 0.0,
+                "size": len(self._query_cache),
+                "max_size": self.query_cache_size,
+            }
+
+    def document_cache_stats(self):
+        """Chunks served from / added to the persistent cache so far, and its current size."""
+        with self._lock:
+            stats = {"reused": self.documents_reused, "embedded": self.documents_embedded, "max_size": self.max_entries}
+            try:
+                (stats["size"],) = self._get_connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            except Exception as e:
+                print(f"⚠️ Embedding cache unavailable: {e}")
+                stats["size"] = None
+        return stats
+
+    def clear_query_cache(self):
+        with self._query_lock:
+            self._query_cache.clear()
+
+_cached_embeddings = None
+
+def get_cached_embeddings():
+    """Return the shared cache-backed embeddings used for ingestion and retrieval."""
+    global _cached_embeddings
+    if _cached_embeddings is None:
+        with _embeddings_lock:
+            if _cached_embeddings is None:
+                _cached_embeddings = CachedEmbeddings()
+    return _cached_embeddings
@@ -0,0 +1,249 @@
+"""
+Pipelined document ingestion.
+Pages flow through extraction → splitting → batched embedding → vector
+store (and keyword index) inserts, with each stage in its own thread connected by bounded queues.
+The first chunks become queryable while later pages are still being
+extracted, and only a few batches are ever held in memory at once.
+"""
+
+import queue
+import threading
+import time
+
+from langchain_core.documents import Document
+
+from numpy_store import NumpyVectorStore
+from pdf_extraction import count_pdf_pages, iter_pdf_pages
+
+# Chunk batches buffered between two stages before the producer blocks
+PIPELINE_QUEUE_SIZE = 4
+# Extracted pages buffered ahead of the splitter
+PAGE_QUEUE_SIZE = 16
+# Text files are streamed in blocks of roughly this many characters
+TEXT_BLOCK_CHARS = 20000
+
+_DONE = object()
+
+class PipelineError(RuntimeError):
+    """Raised in the caller when any pipeline stage failed."""
+
+def _read_text_file(file_path):
+    """Read a text file, falling back to latin-1 like the loader in rag.py."""
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.read()
+    except UnicodeDecodeError:
+        print("  → Retrying with latin-1 encoding...")
+        with open(file_path, "r", encoding="latin-1") as f:
+            return f.read()
+
+def _iter_text_blocks(text):
+    """Yield ``(block_number, text)`` blocks of whole lines."""
+    block, block_chars, block_number = [], 0, 0
+    for line in text.splitlines(keepends=True):
+        block.append(line)
+        block_chars += len(line)
+        if block_chars >= TEXT_BLOCK_CHARS:
+            yield block_number, "".join(block)
+            block, block_chars, block_number = [], 0, block_number + 1
+    if block:
+        yield block_number, "".join(block)
+
+def iter_source_pages(file_path):
+    """Return ``(total_units, iterator of Documents)`` for a PDF or TXT file."""
+    if file_path.lower().endswith(".pdf"):
+        total = count_pdf_pages(file_path)
+        pages = (
+            Document(page_content=text, metadata={"source": file_path, "page": page_number})
+            for page_number, text in iter_pdf_pages(file_path)
+        )
+        return total, pages
+
+    text = _read_text_file(file_path)
+    total = max(1, -(-len(text) // TEXT_BLOCK_CHARS))
+    blocks = (
+        Document(page_content=block, metadata={"source": file_path})
+        for _, block in _iter_text_blocks(text)
+    )
+    return total, blocks
+
+def add_embedded_documents(db, documents, vectors, ids):
+    """Write chunks with vectors that are already computed, so the store never re-embeds them."""
+    texts = [doc.page_content for doc in documents]
+    metadatas = [doc.metadata for doc in documents]
+    if isinstance(db, NumpyVectorStore):
+        db.add_embeddings(texts, vectors, metadatas, ids)
+    else:
+        # Chroma's add_documents would call its embedding function again
+        db._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+
+class IngestPipeline:
+    """Run one document through the four ingestion stages concurrently.
+
+    ``progress(stage, fraction)`` is reported for the slowest stage that is
+    still running, measured in pages (or text blocks) processed.
+    """
+
+    STAGES = ("load", "split", "embed", "persist")
+
+    def __init__(self, db, embeddings, text_splitter, batch_size=64, progress=None, keyword_index=None):
+        self.db = db
+        self.keyword_index = keyword_index
+        self.embeddings = embeddings
+        self.text_splitter = text_splitter
+        self.batch_size = batch_size
+        self.progress = progress or (lambda stage, fraction=0.0, message=None: None)
+
+        self.total_units = 1
+        self.units_done = {stage: 0 for stage in self.STAGES}
+        self.chunk_count = 0
+        self.first_chunk_seconds = None
+        # Time each stage spent working (excluding time blocked on its queues)
+        self.stage_seconds = {stage: 0.0 for stage in self.STAGES}
+        self._error = None
+        self._stop = threading.Event()
+        self._progress_lock = threading.Lock()
+
+    # -- helpers -----------------------------------------------------------
+
+    def _put(self, q, item):
+        """Put with periodic wake-ups so a failed downstream stage cannot deadlock us."""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.2)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
+
+    def _advance(self, stage, units):
+        with self._progress_lock:
+            self.units_done[stage] += units
+            for name in self.STAGES:
+                if self.units_done[name] < self.total_units:
+                    self.progress(name, self.units_done[name] / self.total_units)
+                    break
+
+    def _run_stage(self, stage, func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"❌ Ingestion stage '{stage}' failed: {e}")
+            self._error = self._error or e
+            self._stop.set()
+
+    def _timed(self, stage, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.stage_seconds[stage] += time.perf_counter() - start
+
+    # -- stages --------------------------------------------------------------
+
+    def _extract(self, pages, out_q):
+        pages = iter(pages)
+        while True:
+            page = self._timed("load", next, pages, None)
+            if page is None:
+                break
+            if self._stop.is_set():
+                return
+            if not self._put(out_q, page):
+                return
+            self._advance("load", 1)
+        self._put(out_q, _DONE)
+
+    def _split(self, in_q, out_q, doc_id, filename):
+        batch, batch_pages = [], 0
+        while True:
+            page = self._get(in_q)
+            if page is _DONE:
+                break
+            if page.page_content and page.page_content.strip():
+                for chunk in self._timed("split", self.text_splitter.split_documents, [page]):
+                    if not (chunk.page_content and chunk.page_content.strip()):
+                        continue
+                    chunk_id = f"{doc_id}:{self.chunk_count}"
+                    chunk.metadata.update({"doc_id": doc_id, "chunk_id": chunk_id, "filename": filename})
+                    self.chunk_count += 1
+                    batch.append(chunk)
+            # Pages are credited to downstream stages with the batch they complete in
+            batch_pages += 1
+            self._advance("split", 1)
+            if len(batch) >= self.batch_size:
+                if not self._put(out_q, (batch, batch_pages)):
+                    return
+                batch, batch_pages = [], 0
+        if batch or batch_pages:
+            self._put(out_q, (batch, batch_pages))
+        self._put(out_q, _DONE)
+
+    def _embed(self, in_q, out_q):
+        while True:
+            item = self._get(in_q)
+            if item is _DONE:
+                break
+            batch, pages = item
+            vectors = []
+            if batch:
+                vectors = self._timed("embed", self.embeddings.embed_documents, [doc.page_content for doc in batch])
+            if not self._put(out_q, (batch, vectors, pages)):
+                return
+            self._advance("embed", pages)
+        self._put(out_q, _DONE)
+
+    def _persist(self, in_q, start_time):
+        while True:
+            item = self._get(in_q)
+            if item is _DONE:
+                break
+            batch, vectors, pages = item
+            if batch:
+                ids = [doc.metadata["chunk_id"] for doc in batch]
+                self._timed("persist", add_embedded_documents, self.db, batch, vectors, ids)
+                if self.keyword_index is not None:
+                    self._timed("persist", self.keyword_index.add_documents, batch)
+                if self.first_chunk_seconds is None:
+                    self.first_chunk_seconds = time.perf_counter() - start_time
+                    print(f"⚡ First {len(batch)} chunks queryable after {self.first_chunk_seconds:.2f}s")
+            self._advance("persist", pages)
+
+    # -- entry point ---------------------------------------------------------
+
+    def run(self, file_path, doc_id, filename):
+        """Ingest ``file_path`` and return the number of chunks written."""
+        start_time = time.perf_counter()
+        self.progress("load", 0.0, "Extracting, splitting and embedding document...")
+        self.total_units, pages = iter_source_pages(file_path)
+
+        pages_q = queue.Queue(maxsize=PAGE_QUEUE_SIZE)
+        chunks_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        vectors_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+        threads = [
+            threading.Thread(target=self._run_stage, args=("load", self._extract, pages, pages_q), daemon=True),
+            threading.Thread(target=self._run_stage, args=("split", self._split, pages_q, chunks_q, doc_id, filename), daemon=True),
+            threading.Thread(target=self._run_stage, args=("embed", self._embed, chunks_q, vectors_q), daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        # Persist in the calling thread so Chroma writes stay on one thread
+        self._run_stage("persist", self._persist, vectors_q, start_time)
+        for thread in threads:
+            thread.join()
+
+        if self._error is not None:
+            raise PipelineError(f"Ingestion failed: {self._error}") from self._error
+
+        total_seconds = time.perf_counter() - start_time
+        print(f"✅ Pipelined ingestion of {filename}: {self.chunk_count} chunks in {total_seconds:.2f}s")
+        return self.chunk_count
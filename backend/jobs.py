@@ -0,0 +1,110 @@
+"""
+Background ingestion jobs.
+Runs document ingestion in a worker pool and records per-job progress so
+/upload can return immediately and clients can poll /jobs/{id}.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+INGEST_WORKERS = int(os.environ.get("EDUFY_INGEST_WORKERS", "2"))
+MAX_FINISHED_JOBS = 100
+
+# Ingestion stages in the order they run, with the overall percentage
+# reached once each stage has finished
+JOB_STAGES = {
+    "queued": 0,
+    "load": 20,
+    "split": 30,
+    "embed": 80,
+    "persist": 90,
+    "artifacts": 100,
+}
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def _prune_finished_jobs():
+    """Drop the oldest finished jobs so the registry stays bounded (lock held)."""
+    finished = [job for job in _jobs.values() if job["status"] in ("completed", "failed")]
+    if len(finished) <= MAX_FINISHED_JOBS:
+        return
+    finished.sort(key=lambda job: job["updated_at"])
+    for job in finished[:len(finished) - MAX_FINISHED_JOBS]:
+        _jobs.pop(job["id"], None)
+
+def create_job(filename):
+    """Register a new queued ingestion job and return its id."""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _jobs_lock:
+        _prune_finished_jobs()
+        _jobs[job_id] = {
+            "id": job_id,
+            "filename": filename,
+            "status": "queued",
+            "stage": "queued",
+            "percent": 0,
+            "message": "Waiting for an ingestion worker...",
+            "error": None,
+            "result": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+    return job_id
+
+def update_job(job_id, **fields):
+    """Update fields of a job, ignoring unknown job ids."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        job["updated_at"] = time.time()
+
+def get_job(job_id):
+    """Return a snapshot of a job, or None if it does not exist."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+def make_progress_callback(job_id):
+    """Build a ``progress(stage, fraction)`` callback that maps stage progress to an overall percent."""
+    stage_names = list(JOB_STAGES)
+
+    def progress(stage, fraction=0.0, message=None):
+        index = stage_names.index(stage)
+        start = JOB_STAGES[stage_names[index - 1]] if index > 0 else 0
+        end = JOB_STAGES[stage]
+        fraction = min(max(fraction, 0.0), 1.0)
+        fields = {
+            "status": "running",
+            "stage": stage,
+            "percent": round(start + (end - start) * fraction, 1),
+        }
+        if message:
+            fields["message"] = message
+        update_job(job_id, **fields)
+
+    return progress
+
+def submit_job(job_id, func, *args, **kwargs):
+    """Run ``func(*args, progress=..., **kwargs)`` in the worker pool.
+
+    The function's return value becomes the job result; any exception marks
+    the job as failed with the error message.
+    """
+    def run():
+        update_job(job_id, status="running", message="Processing document...")
+        try:
+            result = func(*args, progress=make_progress_callback(job_id), **kwargs)
+            update_job(job_id, status="completed", percent=100, message="Document ready", result=result)
+        except Exception as e:
+            print(f"❌ Ingestion job {job_id} failed: {e}")
+            update_job(job_id, status="failed", message="Document processing failed", error=str(e))
+
+    return _executor.submit(run)
@@ -0,0 +1,101 @@
+"""
+Persistent LLM response cache.
+Replies are stored in SQLite under a SHA-256 of (model, temperature, prompt),
+so identical prompts (the same question over the same sections, or the same
+flashcard from a re-uploaded document) skip generation across restarts and
+uploads. Entries expire after a TTL and the least recently used ones are
+evicted once the cache is full.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+LLM_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "llm_cache.sqlite3")
+LLM_CACHE_SIZE = int(os.environ.get("EDUFY_LLM_CACHE_SIZE", "5000"))
+# Replies older than this are regenerated (default: 30 days)
+LLM_CACHE_TTL_SECONDS = float(os.environ.get("EDUFY_LLM_CACHE_TTL", str(30 * 24 * 3600)))
+
+class LLMResponseCache:
+    """Bounded, expiring SQLite store of LLM replies keyed by prompt digest."""
+
+    def __init__(self, cache_path=None, max_entries=LLM_CACHE_SIZE, ttl_seconds=LLM_CACHE_TTL_SECONDS):
+        self.cache_path = cache_path or LLM_CACHE_PATH
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._connection = None
+        self.hits = 0
+        self.misses = 0
+
+    def _get_connection(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            self._connection = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self._connection.commit()
+        return self._connection
+
+    @staticmethod
+    def cache_key(model, temperature, prompt):
+        """Stable digest of (model, temperature, full prompt)."""
+        return hashlib.sha256(f"{model}\x00{temperature!r}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached reply for ``key``, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            connection = self._get_connection()
+            row = connection.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at >= ?", (key, now - self.ttl_seconds)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            connection.commit()
+            self.hits += 1
+        return row[0]
+
+    def put(self, key, response):
+        """Store a reply, then drop expired entries and trim to ``max_entries``."""
+        now = time.time()
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            (size,) = connection.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if size > self.max_entries:
+                connection.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (size - self.max_entries,),
+                )
+            connection.commit()
+
+    def clear(self):
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute("DELETE FROM responses")
+            connection.commit()
+
+    def stats(self):
+        with self._lock:
+            (size,) = self._get_connection().execute("SELECT COUNT(*) FROM responses").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "size": size,
+                "max_size": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+            }
@@ -0,0 +1,242 @@
+"""
+Shared Ollama client.
+Holds one pooled keep-alive HTTP session for Ollama's REST API, reusable
+chat models (one per temperature), and the server's health state,
+which is cached for a short TTL and refreshed in the background so request
+paths never block on a health probe. Callers can opt into the persistent
+response cache (llm_cache) for prompts whose reply is worth reusing.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from llm_cache import LLMResponseCache
+
+try:
+    # ChatOllama talks to the server through httpx (via the ollama package)
+    import httpx
+    _CONNECT_ERRORS = (ConnectionError, requests.ConnectionError, httpx.ConnectError)
+except ImportError:
+    _CONNECT_ERRORS = (ConnectionError, requests.ConnectionError)
+
+OLLAMA_BASE_URL = os.environ.get("EDUFY_OLLAMA_URL", "http://localhost:11434")
+LLM_MODEL = os.environ.get("EDUFY_LLM_MODEL", "llama3")
+# How long a health result is trusted before a background refresh is started
+HEALTH_TTL_SECONDS = float(os.environ.get("EDUFY_LLM_HEALTH_TTL", "15"))
+HEALTH_TIMEOUT_SECONDS = 2
+HTTP_POOL_SIZE = 16
+# Client-side limit shared by every chat model; callers' own (shorter) limits
+# are enforced by how long they wait for the call, so one model per
+# temperature serves them all
+LLM_CLIENT_TIMEOUT_SECONDS = float(os.environ.get("EDUFY_LLM_CLIENT_TIMEOUT", "60"))
+
+_session = None
+_session_lock = threading.Lock()
+
+_models = {}
+_models_lock = threading.Lock()
+
+# Runs chat model calls so callers can stop waiting on them
+_call_pool = None
+_call_pool_lock = threading.Lock()
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+_health = {"available": None, "checked_at": 0.0, "refreshing": False}
+_health_lock = threading.Lock()
+
+def get_http_session():
+    """Return the shared keep-alive HTTP session for the Ollama API."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+def check_health():
+    """Probe the Ollama server now and record the result."""
+    try:
+        response = get_http_session().get(f"{OLLAMA_BASE_URL}/api/tags", timeout=HEALTH_TIMEOUT_SECONDS)
+        available = response.status_code == 200
+    except requests.RequestException:
+        available = False
+    with _health_lock:
+        if available != _health["available"]:
+            print("🤖 Ollama server available" if available else "⚠️ Ollama server not available")
+        _health.update(available=available, checked_at=time.monotonic(), refreshing=False)
+    return available
+
+def _refresh_in_background():
+    try:
+        check_health()
+    finally:
+        with _health_lock:
+            _health["refreshing"] = False
+
+def is_llm_available():
+    """Cached health state; a stale value triggers a background refresh and is returned as-is.
+
+    Only the very first call (before any probe has completed) blocks.
+    """
+    with _health_lock:
+        available = _health["available"]
+        stale = time.monotonic() - _health["checked_at"] > HEALTH_TTL_SECONDS
+        start_refresh = available is not None and stale and not _health["refreshing"]
+        if start_refresh:
+            _health["refreshing"] = True
+    if available is None:
+        return check_health()
+    if start_refresh:
+        threading.Thread(target=_refresh_in_background, daemon=True, name="ollama-health").start()
+    return available
+
+def start_health_check():
+    """Probe the server in the background so the first request does not wait for it."""
+    threading.Thread(target=check_health, daemon=True, name="ollama-health").start()
+
+def mark_unavailable():
+    """Record a failed call so other callers skip the LLM until the next refresh."""
+    with _health_lock:
+        _health.update(available=False, checked_at=time.monotonic())
+
+def get_chat_model(temperature=0.3):
+    """Return a shared ChatOllama for this temperature (its HTTP client is reused)."""
+    model = _models.get(temperature)
+    if model is None:
+        with _models_lock:
+            model = _models.get(temperature)
+            if model is None:
+                from langchain_ollama.chat_models import ChatOllama
+                model = ChatOllama(
+                    model=LLM_MODEL, base_url=OLLAMA_BASE_URL, timeout=LLM_CLIENT_TIMEOUT_SECONDS, temperature=temperature
+                )
+                _models[temperature] = model
+    return model
+
+def _get_call_pool():
+    global _call_pool
+    if _call_pool is None:
+        with _call_pool_lock:
+            if _call_pool is None:
+                _call_pool = ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE, thread_name_prefix="ollama-call")
+    return _call_pool
+
+def get_response_cache():
+    """Return the shared persistent LLM response cache."""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = LLMResponseCache()
+    return _response_cache
+
+def _cached_response(key, accept=None):
+    try:
+        response = get_response_cache().get(key)
+    except Exception as e:
+        print(f"⚠️ LLM response cache unavailable: {e}")
+        return None
+    # Entries stored before a stricter check must not keep replacing real calls
+    if response is not None and accept is not None and not accept(response):
+        return None
+    return response
+
+def _remember_response(key, response, accept=None):
+    if not response or not response.strip():
+        return
+    if accept is not None and not accept(response):
+        return
+    try:
+        get_response_cache().put(key, response)
+    except Exception as e:
+        print(f"⚠️ Could not write LLM response cache: {e}")
+
+def invoke_text(prompt, temperature=0.3, timeout=30, cached=False, accept=None):
+    """Run a prompt through the shared chat model and return the reply text.
+
+    With ``cached`` the reply is looked up in, and saved to, the persistent
+    response cache. ``accept`` is the caller's check of a usable reply; only
+    replies it accepts are cached (or served from the cache).
+    Raises TimeoutError if no reply arrives within ``timeout`` seconds; the
+    abandoned call finishes in the background.
+    """
+    key = LLMResponseCache.cache_key(LLM_MODEL, temperature, prompt) if cached else None
+    if key is not None:
+        response = _cached_response(key, accept)
+        if response is not None:
+            return response
+    future = _get_call_pool().submit(get_chat_model(temperature).invoke, prompt)
+    try:
+        message = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise TimeoutError(f"No LLM reply within {timeout:.1f}s") from None
+    except _CONNECT_ERRORS:
+        mark_unavailable()
+        raise
+    response = message.content if hasattr(message, "content") else str(message)
+    if key is not None:
+        _remember_response(key, response, accept)
+    return response
+
+def stream_text(prompt, temperature=0.3, timeout=30, cached=False, accept=None):
+    """Yield the reply text in pieces as the shared chat model generates it.
+
+    With ``cached`` a cached reply is yielded in one piece, and a reply that
+    streams to completion is saved if ``accept`` (when given) allows it.
+    Raises TimeoutError if the next piece takes longer than ``timeout`` seconds.
+    """
+    key = LLMResponseCache.cache_key(LLM_MODEL, temperature, prompt) if cached else None
+    if key is not None:
+        response = _cached_response(key, accept)
+        if response is not None:
+            yield response
+            return
+
+    # The stream is read in the call pool and handed over piece by piece, so a
+    # stalled server costs the caller at most ``timeout`` per piece
+    pieces_q = queue.Queue()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for chunk in get_chat_model(temperature).stream(prompt):
+                if stop.is_set():
+                    return
+                pieces_q.put((chunk.content if hasattr(chunk, "content") else str(chunk), None))
+            pieces_q.put((None, None))
+        except Exception as e:
+            pieces_q.put((None, e))
+
+    _get_call_pool().submit(produce)
+    pieces = []
+    try:
+        while True:
+            try:
+                text, error = pieces_q.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No LLM output within {timeout:.1f}s") from None
+            if error is not None:
+                if isinstance(error, _CONNECT_ERRORS):
+                    mark_unavailable()
+                raise error
+            if text is None:
+                break
+            pieces.append(text)
+            yield text
+    finally:
+        stop.set()
+    if key is not None:
+        _remember_response(key, "".join(pieces), accept)
@@ -1,19 +1,28 @@
 # main.py
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Query, Depends, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from rag import initialize_vector_store, query_documents, load_documents, clear_documents_directory, generate_questions_from_content, generate_simple_flashcards, clear_ai_cache, invalidate_previous_content, enhance_answer_with_ai
-import shutil, os
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from embedding_service import get_cached_embeddings, warm_up_embeddings
+from llm_client import get_response_cache, is_llm_available, start_health_check
+from jobs import create_job, get_job, submit_job
+from upload_writer import check_declared_size, save_upload_stream, UploadTooLargeError
+from sessions import get_session, open_session_count, SESSION_HEADER
+from rag import DEFAULT_RETRIEVAL_MODE, RETRIEVAL_MODES, VECTOR_BACKENDS, add_document_to_store, delete_document_from_store, format_context, generate_fallback_response, is_usable_answer, plan_retrieval, query_documents, retrieve_batch, retrieve_documents, source_name, stream_answer_with_ai, clear_ai_cache
+from study_artifacts import materialize_study_artifacts
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
+import json
+import os
 import time
 
 app = FastAPI()
 
-# Track document state for invalidation
-document_state = {
-    "last_upload_time": 0,
-    "current_filename": "",
-    "content_ready": True,
-    "upload_complete": False
-}
+# POST /query/batch: questions per request, and LLM answers generated at once
+# across all batch requests
+MAX_BATCH_QUESTIONS = int(os.environ.get("EDUFY_MAX_BATCH_QUESTIONS", "100"))
+BATCH_LLM_CONCURRENCY = int(os.environ.get("EDUFY_LLM_CONCURRENCY", "4"))
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_LLM_CONCURRENCY, thread_name_prefix="batch-answer")
 
 # Allow React frontend
 app.add_middleware(
@@ -24,18 +33,178 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize DB & embeddings globally (will be None initially)
-db, embeddings = None, None
+# Each student's documents, vector store, caches and upload state live in a
+# session selected by the X-Session-Id header (missing header = "default")
+def current_session(x_session_id: Optional[str] = Header(None, alias=SESSION_HEADER)):
+    """Resolve the caller's session, opening it if it was evicted or never used.
+
+    The session counts as busy until the request is done with it, so it cannot
+    be evicted (and reopened as a second copy) while the handler still runs.
+    """
+    try:
+        session = get_session(x_session_id, begin_job=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        yield session
+    finally:
+        session.end_job()
+
+@app.middleware("http")
+async def reject_oversized_uploads(request, call_next):
+    """Refuse uploads whose Content-Length is over the limit before the body is read."""
+    if request.method == "POST" and request.url.path == "/upload":
+        try:
+            check_declared_size(request.headers.get("content-length"))
+        except UploadTooLargeError as e:
+            return JSONResponse(status_code=413, content={"error": f"❌ The file is too large. {e}."})
+    return await call_next(request)
+
+@app.on_event("startup")
+def load_embedding_model():
+    """Load and warm up the shared embedding model before serving requests."""
+    start_health_check()
+    warm_up_embeddings()
 
 @app.get("/")
 def read_root():
     """Health check endpoint."""
     return {"message": "Edufy Backend is running!", "status": "healthy"}
 
+def ingest_uploaded_document(session, filename, file_path, file_size, file_hash, progress=None):
+    """Add a freshly saved upload to the session's corpus (runs in the ingestion pool)."""
+    try:
+        with session.corpus_lock:  # never interleaves with a deletion or backend switch
+            return _ingest_uploaded_document(session, filename, file_path, file_size, file_hash, progress)
+    finally:
+        session.end_job(corpus=True)
+
+def remove_registered_document(session, db, entry):
+    """Drop a registered document's chunks, registry entry and file."""
+    delete_document_from_store(db, entry["doc_id"], keyword_index=session.keyword_index)
+    session.registry.unregister_document(entry["doc_id"])
+    if entry.get("path") and os.path.exists(entry["path"]):
+        os.remove(entry["path"])
+
+def _ingest_uploaded_document(session, filename, file_path, file_size, file_hash, progress):
+    registry = session.registry
+    document_state = session.document_state
+
+    # Documents are content-addressed: identical uploads share an id
+    doc_id = file_hash[:16]
+    existing = registry.get_document(doc_id)
+    if existing is not None and existing.get("sha256") != file_hash:
+        # Different content behind the same short id: fall back to a longer one
+        doc_id = file_hash[:32]
+        existing = registry.get_document(doc_id)
+    db = session.get_db(create=True)
+
+    # An older revision with the same filename is replaced, but only once the
+    # new upload is in the corpus
+    older_revision = registry.find_document_by_filename(filename)
+    if older_revision is not None and older_revision["doc_id"] == doc_id:
+        older_revision = None
+
+    if existing is not None:
+        # The same content is already ingested: keep its chunks and file, and
+        # only record the new name
+        print(f"♻️ {filename} is already in the library as {existing['filename']}; skipping ingestion")
+        if file_path != existing.get("path") and os.path.exists(file_path):
+            os.remove(file_path)
+        chunk_count = existing["chunks"]
+        registry.register_document(doc_id, filename, existing["path"], file_size, file_hash, chunk_count)
+        corpus_changed = older_revision is not None
+    else:
+        print("🔄 Processing document and adding it to the vector store...")
+        try:
+            # A failure rolls back this doc_id's chunks; nothing else shares it
+            chunk_count = add_document_to_store(
+                db, file_path, doc_id, progress=progress, keyword_index=session.keyword_index, filename=filename
+            )
+        except Exception:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            document_state.clear()
+            raise
+
+        if chunk_count == 0:
+            # Clean up the file if processing failed; an older revision stays in place
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            document_state.clear()
+            raise ValueError(f"Failed to process {filename}. The document might be empty, corrupted, or contain no readable text. Please try uploading a different document.")
+
+        registry.register_document(doc_id, filename, file_path, file_size, file_hash, chunk_count)
+        corpus_changed = True
+
+    if older_revision is not None:
+        remove_registered_document(session, db, older_revision)
+
+    if corpus_changed:
+        # Generated questions/flashcards and cached answers describe the old corpus
+        clear_ai_cache(session.ai_cache)
+        session.answer_cache.clear()
+
+        # Build this corpus version's flashcards and questions once, up front
+        if progress:
+            progress("artifacts", 0.0, "Preparing flashcards and sample questions...")
+        refresh_study_artifacts(session)
+
+    # Update document state to indicate successful upload
+    document_state.clear()
+    document_state["last_upload_time"] = time.time()
+    document_state["current_filename"] = filename
+    document_state["content_ready"] = True
+    document_state["upload_complete"] = True
+
+    print(f"🎉 Upload complete! {filename} added to the corpus ({chunk_count} chunks)")
+
+    return {
+        "message": f"✅ {filename} uploaded successfully!",
+        "details": "The document was added to your library. Questions and flashcards will include its content.",
+        "doc_id": doc_id,
+        "filename": filename,
+        "file_size": file_size,
+        "chunks": chunk_count,
+        "status": "ready"
+    }
+
+def refresh_study_artifacts(session):
+    """Regenerate the session's stored flashcards and questions; failures only cost freshness."""
+    try:
+        materialize_study_artifacts(session.db, session.registry, session.artifacts, cache=session.ai_cache)
+    except Exception as e:
+        print(f"⚠️ Could not prepare study material: {e}")
+
+def refresh_study_artifacts_job(session, progress=None):
+    """Background variant of ``refresh_study_artifacts`` for corpus changes other than uploads."""
+    try:
+        if progress:
+            progress("artifacts", 0.0, "Preparing flashcards and sample questions...")
+        refresh_study_artifacts(session)
+        return {"message": "✅ Study material updated.", "status": "ready"}
+    finally:
+        session.end_job(corpus=True)
+
+def get_study_artifacts(session):
+    """Stored artifacts for the current corpus, or None while they are being prepared.
+
+    Corpora without stored artifacts (older ones, or a failed refresh) get a
+    background refresh queued unless an upload, deletion or switch will produce them.
+    """
+    artifacts = session.artifacts.get(session.registry.version())
+    if artifacts is None and session.claim_artifact_refresh():
+        submit_job(create_job("artifacts:refresh"), refresh_study_artifacts_job, session)
+    return artifacts
+
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Upload a PDF/TXT file and completely replace all previous documents."""
-    global db, embeddings
+async def upload_file(file: UploadFile = File(...), session=Depends(current_session)):
+    """Upload a PDF/TXT file and queue it to be added to the session's corpus.
+
+    Ingestion runs in the background; poll ``/jobs/{job_id}`` for progress.
+    """
+    file_path = None
+    document_state = session.document_state
     
     try:
         # Step 1: Validate file type first
@@ -44,155 +213,178 @@ async def upload_file(file: UploadFile = File(...)):
         
         print(f"🔄 Starting upload process for: {file.filename}")
         
-        # Step 2: Clear all previous documents and their data
-        print("🗑️ Clearing previous documents...")
-        clear_documents_directory()
-        
-        # Step 3: Clear all cached AI-generated content (questions, flashcards, queries)
-        print("🧹 Clearing AI cache to regenerate content...")
-        clear_ai_cache()
-        
-        # Step 4: Reset document state completely
-        print("📋 Resetting document state...")
-        document_state.clear()  # Clear all previous state
+        # Step 2: Record that an upload is in progress
         document_state["upload_in_progress"] = True
         document_state["current_filename"] = file.filename
         document_state["upload_start_time"] = time.time()
         
-        # Step 5: Create documents directory and save new file
-        docs_dir = os.path.join(os.path.dirname(__file__), "documents")
-        os.makedirs(docs_dir, exist_ok=True)
-        file_path = os.path.join(docs_dir, file.filename)
-
-        print(f"💾 Saving new file: {file.filename}")
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Step 3: Stream the new file into the documents directory. A file
+        # already there belongs to a registered document, which must survive
+        # until the new revision has been ingested, so save next to it
+        docs_dir = session.documents_dir
+        filename = os.path.basename(file.filename)
+        stored_name = filename
+        if os.path.exists(os.path.join(docs_dir, filename)):
+            stored_name = f"{int(time.time() * 1000)}-{filename}"
+
+        print(f"💾 Saving new file: {filename}")
+        file_path, file_size, file_hash = await save_upload_stream(file, docs_dir, stored_name)
         
-        # Step 6: Validate file size and content
-        file_size = os.path.getsize(file_path)
-        if file_size == 0:
-            os.remove(file_path)  # Remove empty file
-            document_state.clear()
+        # Step 4: Reject empty uploads (the writer already discarded the file)
+        if file_path is None:
+            document_state.pop("upload_in_progress", None)
             return {"error": f"❌ The uploaded file {file.filename} is empty. Please upload a valid document."}
         
-        print(f"✅ File saved successfully: {file.filename} ({file_size} bytes)")
+        print(f"✅ File saved successfully: {filename} ({file_size} bytes, sha256 {file_hash[:12]})")
 
-        # Step 7: Recreate the vector store with only the new document
-        print("🔄 Processing document and creating vector store...")
-        db, embeddings = initialize_vector_store(force_recreate=True)
-        
-        if db is None:
-            # Clean up the file if processing failed
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            document_state.clear()
-            return {"error": f"❌ Failed to process {file.filename}. The document might be empty, corrupted, or contain no readable text. Please try uploading a different document."}
-
-        # Step 8: Update document state to indicate successful upload
-        document_state.clear()
-        document_state["last_upload_time"] = time.time()
-        document_state["current_filename"] = file.filename
-        document_state["content_ready"] = True
-        document_state["upload_complete"] = True
-        
-        print(f"🎉 Upload complete! Ready to generate new content for: {file.filename}")
+        # Step 5: Hand the heavy lifting to the ingestion worker pool
+        job_id = create_job(filename)
+        session.begin_job(corpus=True)  # keeps the session resident until ingestion finishes
+        submit_job(job_id, ingest_uploaded_document, session, filename, file_path, file_size, file_hash)
         
         return {
-            "message": f"✅ {file.filename} uploaded successfully!",
-            "details": "Previous documents deleted. New questions and flashcards will be generated based on your new document.",
-            "filename": file.filename,
+            "message": f"📥 {filename} received, processing in the background.",
+            "job_id": job_id,
+            "filename": filename,
             "file_size": file_size,
-            "status": "ready"
+            "sha256": file_hash,
+            "status": "processing"
         }
         
+    except UploadTooLargeError as e:
+        document_state.pop("upload_in_progress", None)
+        return {"error": f"❌ {file.filename} is too large. {e}."}
     except Exception as e:
         print(f"❌ Error during upload: {e}")
         # Clean up any partially created files
-        if os.path.exists(file_path):
+        if file_path and os.path.exists(file_path):
             try:
                 os.remove(file_path)
             except:
                 pass
         return {"error": f"Failed to upload {file.filename}. Error: {str(e)}"}
 
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    """Report the stage and percent complete of a background ingestion job."""
+    job = get_job(job_id)
+    if job is None:
+        return {"error": f"Job {job_id} not found."}
+    return job
+
+def format_file_size(file_size):
+    """Human-readable file size."""
+    return f"{file_size / 1024:.1f} KB" if file_size < 1024*1024 else f"{file_size / (1024*1024):.1f} MB"
+
 @app.get("/status")
-def get_status():
-    """Get the current status of the document database."""
-    current_dir = os.path.dirname(__file__)
-    documents_dir = os.path.join(current_dir, "documents")
-    
-    if not os.path.exists(documents_dir):
-        return {
-            "status": "no_documents",
-            "message": "No documents directory found",
-            "documents": [],
-            "database_ready": False
+def get_status(session=Depends(current_session)):
+    """Get the current status of the session's document database."""
+    db = session.db
+    documents = [
+        {
+            "doc_id": entry["doc_id"],
+            "name": entry["filename"],
+            "size": entry["size"],
+            "size_formatted": format_file_size(entry["size"]),
+            "chunks": entry.get("chunks", 0)
         }
-    
-    # Get list of uploaded documents
-    documents = []
-    for filename in os.listdir(documents_dir):
-        if filename.endswith(('.pdf', '.txt')):
-            file_path = os.path.join(documents_dir, filename)
-            file_size = os.path.getsize(file_path)
-            documents.append({
-                "name": filename,
-                "size": file_size,
-                "size_formatted": f"{file_size / 1024:.1f} KB" if file_size < 1024*1024 else f"{file_size / (1024*1024):.1f} MB"
-            })
+        for entry in session.registry.list_documents()
+    ]
     
     return {
         "status": "ready" if documents and db else "no_documents",
         "message": f"Found {len(documents)} document(s)" if documents else "No documents uploaded",
         "documents": documents,
-        "database_ready": db is not None
+        "database_ready": db is not None,
+        "vector_backend": session.vector_backend,
+        "session": session.session_id,
+        "open_sessions": open_session_count(),
+        "query_embedding_cache": get_cached_embeddings().query_cache_stats(),
+        "embedding_cache": get_cached_embeddings().document_cache_stats(),
+        "answer_cache": session.answer_cache.stats(),
+        "llm_response_cache": get_response_cache().stats(),
+        "llm_available": is_llm_available()
     }
 
+@app.get("/documents")
+def get_documents(session=Depends(current_session)):
+    """List every document in the session's corpus."""
+    return {"documents": session.registry.list_documents()}
+
+@app.delete("/documents/{doc_id}")
+def delete_document(doc_id: str, session=Depends(current_session)):
+    """Remove one document and only its chunks from the session's corpus."""
+    # Waits for a running upload or backend switch, then deletes from the current store
+    with session.corpus_lock:
+        entry = session.registry.get_document(doc_id)
+        if entry is None:
+            return {"error": f"Document {doc_id} not found."}
+
+        try:
+            remove_registered_document(session, session.db, entry)
+            clear_ai_cache(session.ai_cache)
+            session.answer_cache.clear()
+        except Exception as e:
+            print(f"❌ Error deleting document {doc_id}: {e}")
+            return {"error": f"Failed to delete {entry['filename']}. Error: {str(e)}"}
+
+    # Flashcards and questions are rebuilt for the smaller corpus in the background
+    job_id = create_job(f"artifacts:{doc_id}")
+    session.begin_job(corpus=True)
+    submit_job(job_id, refresh_study_artifacts_job, session)
+
+    return {"message": f"🗑️ {entry['filename']} removed from your library.", "doc_id": doc_id, "job_id": job_id}
+
+def switch_session_backend(session, backend, progress=None):
+    """Rebuild the session's corpus on another vector store backend (runs in the ingestion pool)."""
+    try:
+        if progress:
+            progress("embed", 0.0, f"Rebuilding the library on the {backend} vector store...")
+        chunk_count = session.switch_vector_backend(backend, add_document_to_store)
+        return {
+            "message": f"✅ Library now uses the {backend} vector store.",
+            "vector_backend": backend,
+            "chunks": chunk_count,
+            "status": "ready"
+        }
+    finally:
+        session.end_job(corpus=True)
+
+@app.put("/corpus/backend")
+def set_vector_backend(backend: str, session=Depends(current_session)):
+    """Choose the vector store for the session's corpus ("chroma" or "numpy").
+
+    Existing documents are re-indexed in the background; poll ``/jobs/{job_id}``.
+    """
+    if backend not in VECTOR_BACKENDS:
+        return {"error": f"Unknown vector backend '{backend}'. Choose one of: {', '.join(VECTOR_BACKENDS)}"}
+    if backend == session.vector_backend:
+        return {"message": f"Library already uses the {backend} vector store.", "vector_backend": backend, "status": "ready"}
+
+    job_id = create_job(f"vector-backend:{backend}")
+    session.begin_job(corpus=True)
+    submit_job(job_id, switch_session_backend, session, backend)
+    return {"message": f"🔀 Switching to the {backend} vector store.", "job_id": job_id, "status": "processing"}
+
 @app.get("/flashcards")
-def get_flashcards():
-    """Generate flashcards based on the currently uploaded document."""
+def get_flashcards(session=Depends(current_session)):
+    """Serve the flashcards generated for the session's corpus at ingest time."""
+    db = session.db
     if not db:
         return {"error": "No documents uploaded yet. Please upload a document first."}
     
-    # Check if we're in the middle of generating content for a new document
-    current_time = time.time()
-    
-    # Safe access to document state with defaults
-    last_upload_time = document_state.get("last_upload_time", 0)
-    content_ready = document_state.get("content_ready", True)
-    current_filename = document_state.get("current_filename", "document")
-    
-    time_since_upload = current_time - last_upload_time
-    
-    # Show invalid content for first 3 seconds after upload, then generate new content
-    if not content_ready and time_since_upload < 3 and last_upload_time > 0:
-        try:
-            invalid_content = invalidate_previous_content()
+    try:
+        artifacts = get_study_artifacts(session)
+        if artifacts is None:
+            # An upload, deletion or refresh is still being processed
             return {
-                "flashcards": invalid_content["flashcards"],
-                "total": len(invalid_content["flashcards"]),
-                "status": "regenerating",
-                "message": f"Generating new flashcards for {current_filename}..."
+                "flashcards": [],
+                "total": 0,
+                "status": "generating",
+                "message": "Preparing flashcards for your library..."
             }
-        except Exception as e:
-            print(f"Error generating invalid content: {e}")
-            # Continue with normal generation
-    
-    # Mark content generation as complete after delay
-    if not content_ready and time_since_upload >= 3:
-        document_state["content_ready"] = True
-    
-    try:
-        # Get document chunks for flashcard generation
-        retriever = db.as_retriever(search_kwargs={"k": 10})
-        sample_docs = retriever.invoke("main topics concepts definitions")
-        
-        if not sample_docs:
-            return {"flashcards": []}
-        
-        # Generate flashcards from the content
-        flashcards = generate_simple_flashcards(sample_docs)
         
+        flashcards = artifacts["flashcards"]
         return {"flashcards": flashcards, "total": len(flashcards)}
         
     except Exception as e:
@@ -200,87 +392,30 @@ def get_flashcards():
         return {"flashcards": [], "error": "Failed to generate flashcards"}
 
 @app.get("/sample-questions")
-def get_sample_questions():
-    """Generate sample questions based on the currently uploaded document."""
+def get_sample_questions(session=Depends(current_session)):
+    """Serve the sample questions generated for the session's corpus at ingest time."""
+    db = session.db
     if not db:
         return {"error": "No documents uploaded yet. Please upload a document first."}
     
-    # Check if we're in the middle of generating content for a new document
-    current_time = time.time()
-    
-    # Safe access to document state with defaults
-    last_upload_time = document_state.get("last_upload_time", 0)
-    content_generating = document_state.get("content_ready", True)  # Changed from content_generating
-    current_filename = document_state.get("current_filename", "document")
-    
-    time_since_upload = current_time - last_upload_time
-    
-    # Show invalid content for first 3 seconds after upload, then generate new content
-    if not content_generating and time_since_upload < 3 and last_upload_time > 0:
-        try:
-            invalid_content = invalidate_previous_content()
+    try:
+        artifacts = get_study_artifacts(session)
+        if artifacts is None:
+            # An upload, deletion or refresh is still being processed
             return {
-                "questions": invalid_content["questions"],
-                "status": "regenerating",
-                "message": f"Generating new questions for {current_filename}..."
+                "questions": [],
+                "status": "generating",
+                "message": "Preparing sample questions for your library..."
             }
-        except Exception as e:
-            print(f"Error generating invalid content: {e}")
-            # Continue with normal generation
-    
-    # Mark content generation as complete after delay
-    if not content_generating and time_since_upload >= 3:
-        document_state["content_ready"] = True
-    
-    # Get document chunks with diverse content for comprehensive analysis
-    try:
-        # Use multiple queries to get diverse content chunks
-        retriever = db.as_retriever(search_kwargs={"k": 15})  # Get more chunks for better analysis
-        
-        # Multiple targeted queries to capture different aspects of the document
-        queries = [
-            "main concepts definitions important terms",
-            "key topics processes methods procedures", 
-            "examples applications case studies",
-            "principles fundamentals basics overview"
-        ]
-        
-        all_docs = []
-        for query in queries:
-            docs = retriever.invoke(query)
-            all_docs.extend(docs[:4])  # Take top 4 from each query
-        
-        # Remove duplicates based on content
-        unique_docs = []
-        seen_content = set()
-        for doc in all_docs:
-            content_hash = hash(doc.page_content[:100])  # Use first 100 chars as identifier
-            if content_hash not in seen_content:
-                unique_docs.append(doc)
-                seen_content.add(content_hash)
-        
-        sample_docs = unique_docs[:12]  # Use up to 12 diverse chunks
         
-        if not sample_docs:
-            return {"questions": []}
-        
-        # Extract key topics and concepts from the documents
-        sample_questions = generate_questions_from_content(sample_docs)
-        
-        return {"questions": sample_questions}
+        return {"questions": artifacts["questions"]}
         
     except Exception as e:
         print(f"Error generating sample questions: {e}")
         return {"questions": []}
 
-@app.get("/query")
-def query(question: str):
-    """Ask a question based on the currently uploaded document."""
-    if not db:
-        return {"error": "No documents uploaded yet. Please upload a document first to ask questions."}
-    
-    results = query_documents(db, question, use_llm=True)
-    
+def format_query_response(question, results):
+    """Shape ``query_documents`` output into the /query JSON payload."""
     # Handle both old format (list of documents) and new format (dict with ai_response)
     if isinstance(results, dict) and "ai_response" in results:
         # New format with LLM response and metadata
@@ -289,9 +424,10 @@ def query(question: str):
             "ai_response": results["ai_response"],
             "query_type": results.get("query_type", "general"),
             "k_used": results.get("k_used", 3),
+            "retrieval_mode": results.get("retrieval_mode", "vector"),
             "total_sections": len(results["source_documents"]),
             "answers": [
-                {"content": doc.page_content, "source": os.path.basename(doc.metadata.get("source", "unknown"))}
+                {"content": doc.page_content, "source": source_name(doc), "doc_id": doc.metadata.get("doc_id")}
                 for doc in results["source_documents"]
             ]
         }
@@ -303,7 +439,7 @@ def query(question: str):
             "k_used": len(results),
             "total_sections": len(results),
             "answers": [
-                {"content": doc.page_content, "source": os.path.basename(doc.metadata.get("source", "unknown"))}
+                {"content": doc.page_content, "source": source_name(doc), "doc_id": doc.metadata.get("doc_id")}
                 for doc in results
             ]
         }
@@ -318,4 +454,195 @@ def query(question: str):
             "answers": []
         }
 
+def answer_cache_scope(session, doc_ids, mode):
+    """What a cached answer depends on besides the question itself."""
+    return (session.registry.version(), tuple(sorted(doc_ids or [])), mode or DEFAULT_RETRIEVAL_MODE)
+
+def lookup_cached_answer(session, question, question_vector, cache_scope):
+    """Return a cached response for a close-enough earlier question, or None."""
+    cached = session.answer_cache.lookup(question_vector, cache_scope)
+    if cached is None:
+        return None
+    answer, similarity = cached
+    print(f"♻️ Answer cache hit (similarity {similarity:.3f})")
+    return dict(answer, question=question, cached=True, cache_similarity=round(similarity, 4))
 
+def remember_answer(session, question_vector, cache_scope, results, response):
+    # Fallback answers (LLM unavailable) are not worth keeping
+    if isinstance(results, dict) and "ai_response" in results and results["ai_response"] != results.get("basic_response"):
+        session.answer_cache.store(question_vector, cache_scope, response)
+
+@app.get("/query")
+def query(question: str, doc_ids: Optional[List[str]] = Query(None), mode: Optional[str] = None, session=Depends(current_session)):
+    """Ask a question, optionally scoped to one or several documents via ``doc_ids``.
+
+    ``mode`` picks "vector", "hybrid" (BM25 + vector) or "mmr" retrieval.
+    """
+    db = session.db
+    if not db:
+        return {"error": "No documents uploaded yet. Please upload a document first to ask questions."}
+    if mode is not None and mode not in RETRIEVAL_MODES:
+        return {"error": f"Unknown retrieval mode '{mode}'. Choose one of: {', '.join(RETRIEVAL_MODES)}"}
+    
+    # A close-enough rephrasing of an earlier question over the same corpus
+    # and scope reuses that answer instead of retrieval plus an LLM call
+    question_vector = get_cached_embeddings().embed_query(question)
+    cache_scope = answer_cache_scope(session, doc_ids, mode)
+    cached = lookup_cached_answer(session, question, question_vector, cache_scope)
+    if cached is not None:
+        return cached
+    
+    results = query_documents(
+        db, question, use_llm=True, doc_ids=doc_ids, registry=session.registry,
+        keyword_index=session.keyword_index, retrieval_mode=mode
+    )
+    response = format_query_response(question, results)
+    remember_answer(session, question_vector, cache_scope, results, response)
+    return response
+
+def sse_event(event, data):
+    """One Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_query_answer(session, db, question, doc_ids, mode):
+    """Yield SSE messages: ``sources`` once retrieval is done, ``token`` per LLM chunk, then ``done``."""
+    with session.busy():  # keep the session resident while the answer streams
+        question_vector = get_cached_embeddings().embed_query(question)
+        cache_scope = answer_cache_scope(session, doc_ids, mode)
+        cached = lookup_cached_answer(session, question, question_vector, cache_scope)
+        if cached is not None:
+            yield sse_event("sources", {key: value for key, value in cached.items() if key != "ai_response"})
+            yield sse_event("token", {"text": cached["ai_response"]})
+            yield sse_event("done", cached)
+            return
+
+        query_type, k, retrieval_mode, _ = plan_retrieval(
+            db, question, doc_ids, session.registry, session.keyword_index, mode
+        )
+        relevant_docs = retrieve_documents(db, question, k, retrieval_mode, session.keyword_index, doc_ids)
+        if not relevant_docs:
+            response = format_query_response(question, None)
+            yield sse_event("sources", response)
+            yield sse_event("done", response)
+            return
+
+        fallback_response = generate_fallback_response(question, relevant_docs, query_type)
+        results = {
+            "ai_response": "",
+            "source_documents": relevant_docs,
+            "query_type": query_type,
+            "k_used": k,
+            "retrieval_mode": retrieval_mode,
+            "method": "ai_enhanced",
+            "basic_response": fallback_response,
+        }
+        sources = format_query_response(question, results)
+        del sources["ai_response"]
+        yield sse_event("sources", sources)
+
+        pieces = []
+        stream_status = {}
+        for text in stream_answer_with_ai(question, format_context(relevant_docs), fallback_response, status=stream_status):
+            pieces.append(text)
+            yield sse_event("token", {"text": text})
+
+        results["ai_response"] = "".join(pieces).strip()
+        response = format_query_response(question, results)
+        # A stream cut off partway (or too short to count) must not be served again
+        if stream_status["complete"] and is_usable_answer(results["ai_response"]):
+            remember_answer(session, question_vector, cache_scope, results, response)
+        yield sse_event("done", response)
+
+@app.get("/query/stream")
+def query_stream(question: str, doc_ids: Optional[List[str]] = Query(None), mode: Optional[str] = None, session=Depends(current_session)):
+    """Same as /query, but streamed as Server-Sent Events.
+
+    The sources are sent as soon as retrieval finishes and the answer follows
+    token by token, so nothing waits on the full LLM generation.
+    """
+    db = session.db
+    if not db:
+        return {"error": "No documents uploaded yet. Please upload a document first to ask questions."}
+    if mode is not None and mode not in RETRIEVAL_MODES:
+        return {"error": f"Unknown retrieval mode '{mode}'. Choose one of: {', '.join(RETRIEVAL_MODES)}"}
+    
+    return StreamingResponse(
+        stream_query_answer(session, db, question, doc_ids, mode),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    doc_ids: Optional[List[str]] = None
+    mode: Optional[str] = None
+
+def _answer_batch_question(session, db, index, question, relevant_docs, request, question_vector, cache_scope):
+    try:
+        results = query_documents(
+            db, question, use_llm=True, doc_ids=request.doc_ids, registry=session.registry,
+            keyword_index=session.keyword_index, retrieval_mode=request.mode, relevant_docs=relevant_docs
+        )
+        response = format_query_response(question, results)
+        remember_answer(session, question_vector, cache_scope, results, response)
+    except Exception as e:
+        print(f"❌ Error answering batch question {index}: {e}")
+        response = {"question": question, "error": f"Failed to answer question. Error: {str(e)}"}
+    return dict(response, index=index)
+
+def stream_batch_answers(session, db, request):
+    """Yield one NDJSON line per question, in completion order."""
+    with session.busy():  # keep the session resident while answers stream
+        questions = request.questions
+        vectors = get_cached_embeddings().embed_queries(questions)
+        cache_scope = answer_cache_scope(session, request.doc_ids, request.mode)
+
+        # Cached answers go out immediately; the rest share one retrieval pass
+        pending = []
+        for index, (question, vector) in enumerate(zip(questions, vectors)):
+            cached = lookup_cached_answer(session, question, vector, cache_scope)
+            if cached is not None:
+                yield json.dumps(dict(cached, index=index)) + "\n"
+            else:
+                pending.append(index)
+        if not pending:
+            return
+
+        plans = [
+            plan_retrieval(db, questions[index], request.doc_ids, session.registry, session.keyword_index, request.mode)
+            for index in pending
+        ]
+        batch_docs = retrieve_batch(
+            db, [questions[index] for index in pending], [plan[1] for plan in plans], plans[0][2],
+            keyword_index=session.keyword_index, doc_ids=request.doc_ids
+        )
+
+        # LLM answering is the slow part; run it with bounded concurrency
+        futures = [
+            _batch_executor.submit(
+                _answer_batch_question, session, db, index, questions[index], docs, request, vectors[index], cache_scope
+            )
+            for index, docs in zip(pending, batch_docs)
+        ]
+        for future in as_completed(futures):
+            yield json.dumps(future.result()) + "\n"
+
+@app.post("/query/batch")
+def query_batch(request: BatchQueryRequest, session=Depends(current_session)):
+    """Answer many questions at once, streaming NDJSON results as each one completes.
+
+    Every line carries the question's ``index`` in the request, since answers
+    arrive in completion order.
+    """
+    db = session.db
+    if not db:
+        return {"error": "No documents uploaded yet. Please upload a document first to ask questions."}
+    if request.mode is not None and request.mode not in RETRIEVAL_MODES:
+        return {"error": f"Unknown retrieval mode '{request.mode}'. Choose one of: {', '.join(RETRIEVAL_MODES)}"}
+    if not request.questions:
+        return {"error": "No questions provided."}
+    if len(request.questions) > MAX_BATCH_QUESTIONS:
+        return {"error": f"Too many questions: at most {MAX_BATCH_QUESTIONS} per batch."}
+    
+    return StreamingResponse(stream_batch_answers(session, db, request), media_type="application/x-ndjson")
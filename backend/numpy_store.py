@@ -0,0 +1,375 @@
+"""
+In-memory NumPy vector store for small and medium corpora.
+Keeps L2-normalised embeddings in one contiguous float32 matrix and answers
+top-k with a single matrix-vector product plus ``argpartition``. It speaks
+the same LangChain VectorStore interface (and Chroma-style ``where`` filters)
+as the Chroma store, so either can back a corpus.
+"""
+
+import json
+import mmap
+import os
+import threading
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+VECTORS_FILENAME = "vectors.npy"
+CHUNKS_FILENAME = "chunks.json"
+# Optional float16 snapshot opened with mmap: vectors, concatenated UTF-8 chunk
+# texts, and a table of chunk ids, metadata and byte offsets into the texts.
+# "float16" writes it on persist; "float32" keeps the plain format above.
+SNAPSHOT_DTYPE = os.environ.get("EDUFY_EMBEDDING_SNAPSHOT", "float32")
+SNAPSHOT_VECTORS_FILENAME = "vectors.f16.npy"
+SNAPSHOT_TEXTS_FILENAME = "texts.bin"
+SNAPSHOT_INDEX_FILENAME = "chunk_index.json"
+# Rows scored per block, so float16 snapshots are upcast a block at a time
+SCORE_BLOCK_ROWS = 65536
+
+def normalize_rows(matrix):
+    """L2-normalise each row of a float32 matrix (zero rows stay zero)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def max_marginal_relevance(query_vectors, candidate_vectors, k, lambda_mult=0.5):
+    """Pick ``k`` candidate indices balancing relevance and diversity (MMR).
+
+    Relevance is a candidate's best cosine similarity to any query; each step
+    picks the candidate maximising ``lambda * relevance - (1 - lambda) *
+    similarity to the closest already-selected candidate``. The pairwise
+    similarities come from one matrix product and each step is a vector update.
+    """
+    candidate_vectors = np.asarray(candidate_vectors, dtype=np.float32)
+    if candidate_vectors.size == 0 or k <= 0:
+        return []
+    candidates = normalize_rows(candidate_vectors)
+    queries = normalize_rows(query_vectors)
+    relevance = (candidates @ queries.T).max(axis=1)
+    pairwise = candidates @ candidates.T
+
+    k = min(k, candidates.shape[0])
+    selected = []
+    redundancy = np.full(candidates.shape[0], -np.inf, dtype=np.float32)
+    available = np.ones(candidates.shape[0], dtype=bool)
+    for _ in range(k):
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0) if selected else 0.0
+        scores = lambda_mult * relevance - (1 - lambda_mult) * penalty
+        scores = np.where(available, scores, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+    return selected
+
+def _matches(metadata, where):
+    """Evaluate the subset of Chroma's ``where`` syntax used in this app."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+class _MappedTexts:
+    """Read-only sequence of chunk texts decoded on demand from a memory-mapped file."""
+
+    def __init__(self, path, offsets):
+        self._offsets = offsets
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b""
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        return self._map[self._offsets[row]:self._offsets[row + 1]].decode("utf-8")
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+class NumpyVectorStore(VectorStore):
+    """Exact cosine-similarity search over an in-memory float32 matrix.
+
+    A store opened from a float16 snapshot searches the memory-mapped file
+    directly and only copies it into memory on the first write.
+    """
+
+    def __init__(self, embedding_function, persist_directory=None, snapshot_dtype=SNAPSHOT_DTYPE):
+        self._embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.snapshot_dtype = snapshot_dtype
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._size = 0
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._id_to_row = {}
+        self._dirty = False
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    # -- storage ---------------------------------------------------------------
+
+    def _materialize(self):
+        """Copy a memory-mapped snapshot into writable memory before mutating it (lock held)."""
+        if isinstance(self._matrix, np.memmap):
+            self._matrix = np.array(self._matrix[:self._size], dtype=np.float32)
+        if isinstance(self._texts, _MappedTexts):
+            self._texts = list(self._texts)
+
+    def _ensure_capacity(self, extra_rows, dim):
+        """Grow the matrix geometrically so appends stay amortised O(1) per row."""
+        needed = self._size + extra_rows
+        if self._matrix.shape[1] not in (0, dim):
+            raise ValueError(f"Embedding dimension {dim} does not match store dimension {self._matrix.shape[1]}")
+        if needed <= self._matrix.shape[0] and self._matrix.shape[1] == dim:
+            return
+        capacity = max(needed, 2 * self._matrix.shape[0], 256)
+        grown = np.zeros((capacity, dim), dtype=np.float32)
+        if self._size:
+            # An empty store has no dimension yet (its matrix is (0, 0))
+            grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+
+    def _rows_matching(self, where):
+        if not where:
+            return np.arange(self._size)
+        return np.array([row for row in range(self._size) if _matches(self._metadatas[row], where)], dtype=np.int64)
+
+    def add_embeddings(self, texts, vectors, metadatas=None, ids=None):
+        """Add pre-computed vectors (normalised here); existing ids are replaced."""
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        vectors = normalize_rows(vectors)
+
+        with self._lock:
+            self._materialize()
+            existing = [chunk_id for chunk_id in ids if chunk_id in self._id_to_row]
+            if existing:
+                self._delete_ids(existing)
+            self._ensure_capacity(len(texts), vectors.shape[1])
+            self._matrix[self._size:self._size + len(texts)] = vectors
+            for offset, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                self._id_to_row[chunk_id] = self._size + offset
+                self._ids.append(chunk_id)
+                self._texts.append(text)
+                self._metadatas.append(dict(metadata or {}))
+            self._size += len(texts)
+            self._dirty = True
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        vectors = self._embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas, ids)
+
+    def _delete_ids(self, ids):
+        """Remove rows by id, compacting the matrix (lock held)."""
+        remove = {self._id_to_row[chunk_id] for chunk_id in ids if chunk_id in self._id_to_row}
+        if not remove:
+            return
+        self._materialize()
+        keep = np.array([row for row in range(self._size) if row not in remove], dtype=np.int64)
+        self._matrix[:len(keep)] = self._matrix[keep]
+        self._ids = [self._ids[row] for row in keep]
+        self._texts = [self._texts[row] for row in keep]
+        self._metadatas = [self._metadatas[row] for row in keep]
+        self._size = len(keep)
+        self._id_to_row = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        self._dirty = True
+
+    def delete(self, ids=None, where=None, **kwargs):
+        """Delete by ids and/or a Chroma-style ``where`` metadata filter."""
+        with self._lock:
+            targets = list(ids or [])
+            if where:
+                targets.extend(self._ids[row] for row in self._rows_matching(where))
+            self._delete_ids(targets)
+        return True
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        """Chroma-compatible ``get`` returning ids, documents, metadatas (and embeddings)."""
+        with self._lock:
+            if ids is not None:
+                rows = [self._id_to_row[chunk_id] for chunk_id in ids if chunk_id in self._id_to_row]
+            else:
+                rows = list(self._rows_matching(where))
+            result = {"ids": [self._ids[row] for row in rows]}
+            if "documents" in include:
+                result["documents"] = [self._texts[row] for row in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[row] for row in rows]
+            if "embeddings" in include:
+                result["embeddings"] = self._matrix[rows].astype(np.float32)
+        return result
+
+    def count(self):
+        return self._size
+
+    # -- search ----------------------------------------------------------------
+
+    def search_by_vectors(self, query_vectors, k=4, filter=None):
+        """Top-k rows and cosine scores for each query vector in one matrix product."""
+        queries = normalize_rows(query_vectors)
+        with self._lock:
+            rows = self._rows_matching(filter) if filter else None
+            count = self._size if rows is None else len(rows)
+            if count == 0:
+                return [[] for _ in range(len(queries))]
+            scores = np.empty((len(queries), count), dtype=np.float32)
+            for start in range(0, count, SCORE_BLOCK_ROWS):
+                stop = min(count, start + SCORE_BLOCK_ROWS)
+                block = self._matrix[start:stop] if rows is None else self._matrix[rows[start:stop]]
+                scores[:, start:stop] = queries @ block.astype(np.float32, copy=False).T
+            k = min(k, count)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            results = []
+            for query_index in range(len(queries)):
+                candidates = top[query_index]
+                ordered = candidates[np.argsort(-scores[query_index, candidates])]
+                results.append([
+                    (int(ordered_row if rows is None else rows[ordered_row]), float(scores[query_index, ordered_row]))
+                    for ordered_row in ordered
+                ])
+            return results
+
+    def vectors_at(self, rows):
+        """Return the stored (normalised) embeddings for ``rows``."""
+        with self._lock:
+            return self._matrix[np.asarray(rows, dtype=np.int64)].astype(np.float32)
+
+    def document_at(self, row):
+        """Return the chunk stored at ``row`` as a Document."""
+        return Document(page_content=self._texts[row], metadata=dict(self._metadatas[row]), id=self._ids[row])
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        (hits,) = self.search_by_vectors([embedding], k=k, filter=filter)
+        with self._lock:
+            return [(self.document_at(row), score) for row, score in hits]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self._embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities in [-1, 1]
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, persist_directory=None, **kwargs):
+        store = cls(embedding, persist_directory=persist_directory)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    # -- persistence -------------------------------------------------------------
+
+    def _paths(self, *filenames):
+        return [os.path.join(self.persist_directory, filename) for filename in filenames]
+
+    def persist(self):
+        """Write the store to ``persist_directory`` atomically (plain or float16 snapshot format)."""
+        if not self.persist_directory or not self._dirty:
+            return
+        os.makedirs(self.persist_directory, exist_ok=True)
+        with self._lock:
+            if self.snapshot_dtype == "float16":
+                written = self._write_snapshot()
+                stale = self._paths(VECTORS_FILENAME, CHUNKS_FILENAME)
+            else:
+                written = self._write_plain()
+                stale = self._paths(SNAPSHOT_VECTORS_FILENAME, SNAPSHOT_TEXTS_FILENAME, SNAPSHOT_INDEX_FILENAME)
+            for path in written:
+                os.replace(path + ".tmp", path)
+            for path in stale:
+                if os.path.exists(path):
+                    os.remove(path)
+            self._dirty = False
+
+    def _write_plain(self):
+        vectors_path, chunks_path = self._paths(VECTORS_FILENAME, CHUNKS_FILENAME)
+        with open(vectors_path + ".tmp", "wb") as f:
+            np.save(f, np.asarray(self._matrix[:self._size], dtype=np.float32))
+        with open(chunks_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": self._ids, "texts": list(self._texts), "metadatas": self._metadatas}, f)
+        return [vectors_path, chunks_path]
+
+    def _write_snapshot(self):
+        vectors_path, texts_path, index_path = self._paths(
+            SNAPSHOT_VECTORS_FILENAME, SNAPSHOT_TEXTS_FILENAME, SNAPSHOT_INDEX_FILENAME
+        )
+        with open(vectors_path + ".tmp", "wb") as f:
+            np.save(f, np.asarray(self._matrix[:self._size], dtype=np.float16))
+        offsets = [0]
+        with open(texts_path + ".tmp", "wb") as f:
+            for text in self._texts:
+                encoded = text.encode("utf-8")
+                f.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+        with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": self._ids, "offsets": offsets, "metadatas": self._metadatas}, f)
+        return [vectors_path, texts_path, index_path]
+
+    @classmethod
+    def load(cls, persist_directory, embedding_function, snapshot_dtype=SNAPSHOT_DTYPE):
+        """Open a persisted store, or an empty one if nothing was saved yet.
+
+        A float16 snapshot is memory-mapped rather than read, so opening it
+        costs page faults on first use instead of full deserialisation.
+        """
+        store = cls(embedding_function, persist_directory=persist_directory, snapshot_dtype=snapshot_dtype)
+        vectors_path, chunks_path = store._paths(VECTORS_FILENAME, CHUNKS_FILENAME)
+        snapshot_vectors_path, texts_path, index_path = store._paths(
+            SNAPSHOT_VECTORS_FILENAME, SNAPSHOT_TEXTS_FILENAME, SNAPSHOT_INDEX_FILENAME
+        )
+        if os.path.exists(index_path) and os.path.exists(snapshot_vectors_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            store._matrix = np.load(snapshot_vectors_path, mmap_mode="r")
+            store._texts = _MappedTexts(texts_path, index["offsets"])
+            store._ids = index["ids"]
+            store._metadatas = index["metadatas"]
+        elif os.path.exists(vectors_path) and os.path.exists(chunks_path):
+            with open(chunks_path, "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+            store._matrix = np.ascontiguousarray(np.load(vectors_path), dtype=np.float32)
+            store._ids = chunks["ids"]
+            store._texts = chunks["texts"]
+            store._metadatas = chunks["metadatas"]
+        else:
+            return store
+        store._size = store._matrix.shape[0]
+        store._id_to_row = {chunk_id: row for row, chunk_id in enumerate(store._ids)}
+        # Rewrite in the configured format on the next persist if it differs
+        store._dirty = (snapshot_dtype == "float16") != isinstance(store._matrix, np.memmap)
+        return store
@@ -0,0 +1,129 @@
+"""
+PDF text extraction.
+Large PDFs are sharded into page ranges and extracted across a process pool,
+then reassembled in page order. Workers are spawned rather than forked,
+since ingestion runs in threads of a process that already has torch and
+tokenizer threads; this module deliberately imports only pypdf at the top so
+those spawned workers start quickly.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pypdf import PdfReader
+
+# Number of extraction processes; 1 (or less) disables the process pool
+PDF_EXTRACT_WORKERS = int(os.environ.get("EDUFY_PDF_WORKERS", str(os.cpu_count() or 1)))
+# Below this many pages the pool start-up cost outweighs the parallel speed-up
+PARALLEL_MIN_PAGES = int(os.environ.get("EDUFY_PDF_PARALLEL_MIN_PAGES", "32"))
+# Shards per worker; more, smaller shards balance uneven pages better
+SHARDS_PER_WORKER = 4
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+def _get_pool(workers):
+    """Return the shared extraction pool, recreating it if the worker count changed."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next extraction starts a fresh one."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            _pool_workers = None
+    pool.shutdown(wait=False)
+
+def _extract_page_range(pdf_path, start, end):
+    """Extract text for pages [start, end) in a worker process."""
+    reader = PdfReader(pdf_path)
+    return [(page_number, reader.pages[page_number].extract_text() or "")
+            for page_number in range(start, end)]
+
+def _page_ranges(total_pages, shard_count):
+    """Split ``total_pages`` into at most ``shard_count`` contiguous ranges."""
+    shard_size = max(1, -(-total_pages // shard_count))
+    return [(start, min(start + shard_size, total_pages))
+            for start in range(0, total_pages, shard_size)]
+
+def _iter_pages_parallel(pdf_path, total_pages, workers):
+    """Yield ``(page, text)`` in page order as each shard finishes in the pool."""
+    ranges = _page_ranges(total_pages, workers * SHARDS_PER_WORKER)
+
+    pool = _get_pool(workers)
+    try:
+        futures = [pool.submit(_extract_page_range, pdf_path, start, end) for start, end in ranges]
+        # Futures are collected in submission order, so pages come back in order
+        for future in futures:
+            yield from future.result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+
+def extract_pages_parallel(pdf_path, total_pages, workers=None):
+    """Extract every page of a PDF with a process pool, returning ``(page, text)`` in order."""
+    return list(_iter_pages_parallel(pdf_path, total_pages, workers or PDF_EXTRACT_WORKERS))
+
+def count_pdf_pages(pdf_path):
+    """Return the number of pages in a PDF."""
+    return len(PdfReader(pdf_path).pages)
+
+def iter_pdf_pages(pdf_path, workers=None):
+    """Yield ``(page, text)`` in page order as soon as pages are extracted.
+
+    Large PDFs stream shard by shard from the process pool; small ones are
+    read page by page in the calling thread. If the pool fails, the pages it
+    has not delivered yet are read serially instead.
+    """
+    workers = workers or PDF_EXTRACT_WORKERS
+    reader = PdfReader(pdf_path)
+    total_pages = len(reader.pages)
+    next_page = 0
+
+    if workers > 1 and total_pages >= PARALLEL_MIN_PAGES:
+        try:
+            for page_number, text in _iter_pages_parallel(pdf_path, total_pages, workers):
+                yield page_number, text
+                next_page = page_number + 1
+            return
+        except Exception as e:
+            print(f"⚠️ Parallel PDF extraction failed at page {next_page}, continuing serially: {e}")
+
+    for page_number in range(next_page, total_pages):
+        yield page_number, reader.pages[page_number].extract_text() or ""
+
+def load_pdf_pages(pdf_path, workers=None):
+    """Load a PDF into one Document per page, using the process pool for large files.
+
+    Returns the same ``source``/``page`` metadata as ``PyPDFLoader`` so the rest
+    of the pipeline cannot tell which path was taken.
+    """
+    from langchain_core.documents import Document
+
+    workers = workers or PDF_EXTRACT_WORKERS
+    if workers > 1:
+        try:
+            total_pages = len(PdfReader(pdf_path).pages)
+            if total_pages >= PARALLEL_MIN_PAGES:
+                print(f"⚡ Extracting {total_pages} pages with {workers} worker processes")
+                return [
+                    Document(page_content=text, metadata={"source": pdf_path, "page": page_number})
+                    for page_number, text in extract_pages_parallel(pdf_path, total_pages, workers)
+                ]
+        except Exception as e:
+            print(f"⚠️ Parallel PDF extraction failed, falling back to serial: {e}")
+
+    from langchain_community.document_loaders import PyPDFLoader
+    return PyPDFLoader(pdf_path).load()
@@ -1,13 +1,56 @@
 import os
 import glob
+import json
+import math
 import shutil
 import re
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
 from langchain.text_splitter import CharacterTextSplitter, RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader, PyPDFLoader
+from langchain_community.document_loaders import TextLoader
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.documents import Document
 from langchain_core.messages import HumanMessage, SystemMessage
 from domain_data import DOMAIN_KEYWORDS, DOMAIN_QUESTIONS, DOMAIN_FLASHCARDS
+from embedding_service import get_cached_embeddings
+from pdf_extraction import load_pdf_pages
+from ingest_pipeline import IngestPipeline
+from numpy_store import NumpyVectorStore, max_marginal_relevance
+from bm25_index import BM25Index
+from llm_client import get_chat_model, invoke_text, is_llm_available, stream_text
+
+# Chroma collection used by the default (single-user) session
+DEFAULT_COLLECTION_NAME = "langchain"
+
+# Vector store backends a corpus can use: Chroma (HNSW, on disk) or exact
+# in-memory NumPy search, which is faster for small and medium corpora
+VECTOR_BACKENDS = ("chroma", "numpy")
+DEFAULT_VECTOR_BACKEND = os.environ.get("EDUFY_VECTOR_BACKEND", "chroma")
+
+# "vector" (embedding similarity only), "hybrid" (BM25 + vectors fused with
+# reciprocal rank fusion; ranks exact-term matches higher, so fewer chunks
+# are sent to the LLM) or "mmr" (similar chunks, but not to each other)
+RETRIEVAL_MODES = ("vector", "hybrid", "mmr")
+DEFAULT_RETRIEVAL_MODE = os.environ.get("EDUFY_RETRIEVAL_MODE", "hybrid")
+# Standard RRF damping constant
+RRF_K = 60
+# Share of the dynamic k kept after fusion in hybrid mode
+HYBRID_K_RATIO = 0.75
+# MMR trade-off: 1.0 is pure relevance, 0.0 pure diversity
+MMR_LAMBDA = 0.5
+
+# Number of chunks embedded / written to Chroma per step during ingestion
+INGEST_BATCH_SIZE = 64
+
+# Flashcard enhancement: LLM calls in flight at once (shared by all requests)
+# and the overall time budget for one flashcard set
+FLASHCARD_ENHANCE_CONCURRENCY = int(os.environ.get("EDUFY_FLASHCARD_CONCURRENCY", "4"))
+FLASHCARD_ENHANCE_DEADLINE = float(os.environ.get("EDUFY_FLASHCARD_DEADLINE", "60"))
+# "batch" sends a whole flashcard set in one prompt; "per-card" makes one call per card
+FLASHCARD_ENHANCE_MODE = os.environ.get("EDUFY_FLASHCARD_ENHANCE_MODE", "batch")
+FLASHCARD_BATCH_SIZE = 15
+_flashcard_executor = ThreadPoolExecutor(max_workers=FLASHCARD_ENHANCE_CONCURRENCY, thread_name_prefix="flashcard-llm")
 
 # Simple cache to avoid multiple simultaneous AI calls
 _ai_cache = {}
@@ -21,48 +64,27 @@ def get_cache_lock():
         _ai_cache_lock = threading.Lock()
     return _ai_cache_lock
 
-def clear_ai_cache():
+def clear_ai_cache(cache=None):
     """Clear the AI cache to force regeneration of questions and flashcards.
     
     This should be called when a new document is uploaded to ensure that
     cached questions and flashcards don't persist across different documents.
+    Pass a session's ``cache`` dict to clear only that session's entries.
     """
-    global _ai_cache
+    if cache is None:
+        cache = _ai_cache
     lock = get_cache_lock()
     with lock:
-        cache_size = len(_ai_cache)
-        _ai_cache.clear()
+        cache_size = len(cache)
+        cache.clear()
         if cache_size > 0:
             print(f"🔄 Cleared AI cache: {cache_size} cached items invalidated for new document")
         else:
             print("🔄 AI cache cleared (was already empty)")
 
-def enhance_answer_with_ai(question, context_content, basic_answer=""):
-    """Use AI model to generate enhanced, valid answers for questions."""
-    try:
-        # Check if Ollama is available
-        import requests
-        try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=2)
-            if response.status_code != 200:
-                print("⚠️ Ollama server not responding, using basic answer")
-                return basic_answer if basic_answer else "Unable to generate enhanced answer - AI service unavailable"
-        except:
-            print("⚠️ Ollama server not available, using basic answer")
-            return basic_answer if basic_answer else "Unable to generate enhanced answer - AI service unavailable"
-        
-        from langchain_ollama.chat_models import ChatOllama
-        from langchain_core.messages import SystemMessage, HumanMessage
-        
-        # Initialize Ollama model
-        model = ChatOllama(
-            model="llama3",
-            timeout=30,
-            temperature=0.3
-        )
-        
-        # Create an enhanced prompt
-        prompt = f"""You are an expert educational assistant. Generate a comprehensive, accurate, and well-structured answer based on the provided context.
+def build_answer_prompt(question, context_content, basic_answer=""):
+    """Prompt used to answer a student's question from the retrieved sections."""
+    return f"""You are an expert educational assistant. Generate a comprehensive, accurate, and well-structured answer based on the provided context.
 
 QUESTION: {question}
 
@@ -85,11 +107,25 @@ INSTRUCTIONS:
 
 Generate a clear, comprehensive answer that would help a student understand the topic thoroughly:"""
 
+def is_usable_answer(text):
+    """Answers this short are treated as a failed generation."""
+    return bool(text) and len(text.strip()) > 50
+
+def enhance_answer_with_ai(question, context_content, basic_answer=""):
+    """Use AI model to generate enhanced, valid answers for questions."""
+    try:
+        # Cached health state; no per-call probe
+        if not is_llm_available():
+            print("⚠️ Ollama server not available, using basic answer")
+            return basic_answer if basic_answer else "Unable to generate enhanced answer - AI service unavailable"
+        
+        prompt = build_answer_prompt(question, context_content, basic_answer)
+
         try:
-            # Generate enhanced answer
-            enhanced_response = model.invoke(prompt)
+            # Generate enhanced answer with the shared chat model
+            enhanced_response = invoke_text(prompt, temperature=0.3, timeout=30, cached=True, accept=is_usable_answer)
             
-            if enhanced_response and len(enhanced_response.strip()) > 50:
+            if is_usable_answer(enhanced_response):
                 print("✅ Generated AI-enhanced answer")
                 return enhanced_response.strip()
             else:
@@ -104,64 +140,228 @@ Generate a clear, comprehensive answer that would help a student understand the
         print(f"⚠️ Error with AI enhancement: {e}")
         return basic_answer if basic_answer else "Error with AI enhancement."
 
-def enhance_flashcard_answers(flashcards, document_content):
-    """Enhance flashcard answers using AI model optimized for memory and recall."""
+def stream_answer_with_ai(question, context_content, basic_answer="", status=None):
+    """Yield the answer to ``question`` piece by piece as the LLM produces it.
+
+    Falls back to ``basic_answer`` in one piece if the LLM is unavailable or
+    fails before producing any text; a failure mid-answer ends the stream.
+    ``status`` (a dict) gets ``complete=True`` only when the LLM's answer
+    streamed to the end, so callers can tell a full answer from a fallback
+    or a cut-off one.
+    """
+    if status is None:
+        status = {}
+    status["complete"] = False
+    if not is_llm_available():
+        print("⚠️ Ollama server not available, using basic answer")
+        yield basic_answer if basic_answer else "Unable to generate enhanced answer - AI service unavailable"
+        return
+
+    produced = False
+    try:
+        prompt = build_answer_prompt(question, context_content, basic_answer)
+        # Same prompt and cache entry as enhance_answer_with_ai
+        for text in stream_text(prompt, temperature=0.3, timeout=30, cached=True, accept=is_usable_answer):
+            if text:
+                produced = True
+                yield text
+        status["complete"] = produced
+    except Exception as e:
+        print(f"⚠️ Error streaming enhanced answer: {e}")
+        if produced:
+            return
+    if not produced:
+        yield basic_answer if basic_answer else "Unable to generate a comprehensive answer from the available content."
+
+def _enhanced_card(card, enhanced_answer, memory_optimized=True):
+    """Flashcard dict with the enhanced answer, keeping the original and any extra fields."""
+    enhanced_card = {
+        "question": card.get("question", ""),
+        "answer": enhanced_answer,
+        "original_answer": card.get("answer", ""),
+        "difficulty": card.get("difficulty", "medium"),
+        "category": card.get("category", "general"),
+        "memory_optimized": memory_optimized
+    }
+    
+    # Preserve any additional fields
+    for key, value in card.items():
+        if key not in ["question", "answer", "difficulty", "category"]:
+            enhanced_card[key] = value
+    return enhanced_card
+
+def _enhance_card(card, document_content, expires_at):
+    # Cards reaching a worker after the deadline skip the LLM, and the call
+    # itself may only use the time that is left, so no card holds a pool slot
+    # much past the deadline
+    remaining = expires_at - time.monotonic()
+    if remaining <= 0:
+        return card.get("answer", "")
+    question = card.get("question", "")
+    print(f"🧠 Optimizing flashcard for recall: {question[:40]}...")
+    return enhance_flashcard_for_memory(
+        question,
+        card.get("answer", ""),
+        document_content,
+        card.get("difficulty", "medium"),
+        card.get("category", "general"),
+        timeout=min(25, remaining),
+    )
+
+def enhance_flashcard_answers(flashcards, document_content, deadline=FLASHCARD_ENHANCE_DEADLINE):
+    """Enhance flashcard answers using AI model optimized for memory and recall.
+    
+    Cards are enhanced concurrently (at most FLASHCARD_ENHANCE_CONCURRENCY LLM
+    calls at once) and come back in their original order. Cards not finished
+    within ``deadline`` seconds keep their original answer: queued cards are
+    cancelled, and LLM calls already running are limited to the time that was
+    left when they started, so they release their pool slot around the deadline.
+    """
     if not flashcards:
         return flashcards
     
-    enhanced_flashcards = []
+    expires_at = time.monotonic() + deadline
+    futures = [_flashcard_executor.submit(_enhance_card, card, document_content, expires_at) for card in flashcards]
+    done, not_done = wait(futures, timeout=deadline)
+    for future in not_done:
+        future.cancel()
+    if not_done:
+        print(f"⏱️ Flashcard deadline of {deadline}s reached: {len(not_done)} of {len(flashcards)} cards keep their original answer")
     
-    for i, card in enumerate(flashcards):
-        question = card.get("question", "")
-        original_answer = card.get("answer", "")
-        difficulty = card.get("difficulty", "medium")
-        category = card.get("category", "general")
-        
-        print(f"� Optimizing flashcard {i+1}/{len(flashcards)} for recall: {question[:40]}...")
-        
-        # Create memory-focused enhancement prompt
-        enhanced_answer = enhance_flashcard_for_memory(question, original_answer, document_content, difficulty, category)
-        
-        enhanced_card = {
-            "question": question,
-            "answer": enhanced_answer,
-            "original_answer": original_answer,
-            "difficulty": difficulty,
-            "category": category,
-            "memory_optimized": True
-        }
-        
-        # Preserve any additional fields
-        for key, value in card.items():
-            if key not in ["question", "answer", "difficulty", "category"]:
-                enhanced_card[key] = value
-        
-        enhanced_flashcards.append(enhanced_card)
+    enhanced_flashcards = []
+    for card, future in zip(flashcards, futures):
+        if future in done and future.exception() is None:
+            enhanced_flashcards.append(_enhanced_card(card, future.result()))
+        else:
+            enhanced_flashcards.append(_enhanced_card(card, card.get("answer", ""), memory_optimized=False))
     
     return enhanced_flashcards
 
-def enhance_flashcard_for_memory(question, original_answer, document_content, difficulty, category):
+def _clean_flashcard_answer(answer):
+    """Trim an LLM flashcard answer to at most two sentences; None if it is unusable."""
+    if not isinstance(answer, str) or len(answer.strip()) <= 10:
+        return None
+    # Clean up the response
+    clean_answer = answer.strip()
+    
+    # Ensure it's not too long (memory principle)
+    sentences = clean_answer.split('.')
+    if len(sentences) > 3:
+        clean_answer = '. '.join(sentences[:2]).strip() + '.'
+    
+    return clean_answer
+
+def _parse_json_array(text):
+    """Extract the first JSON array from an LLM reply (models often wrap it in prose)."""
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end <= start:
+        return None
+    try:
+        parsed = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, list) else None
+
+def enhance_flashcards_batch(flashcards, document_content, deadline=FLASHCARD_ENHANCE_DEADLINE):
+    """Enhance a whole flashcard set with one LLM call per FLASHCARD_BATCH_SIZE cards.
+    
+    The document context and rules are sent once, the cards as a numbered
+    JSON list, and the model answers with a JSON array. Each returned answer
+    is validated; cards whose answer is missing or unusable (or every card,
+    if the reply cannot be parsed) fall back to per-card enhancement.
+    ``deadline`` covers the whole set: every batch call and the fallback only
+    get the time still left.
+    """
+    if not flashcards:
+        return flashcards
+    
+    expires_at = time.monotonic() + deadline
+    answers = {}
+    if is_llm_available():
+        for start in range(0, len(flashcards), FLASHCARD_BATCH_SIZE):
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                print("⏱️ Flashcard deadline reached before every batch was sent")
+                break
+            batch = flashcards[start:start + FLASHCARD_BATCH_SIZE]
+            cards_json = json.dumps([
+                {
+                    "id": start + offset,
+                    "question": card.get("question", ""),
+                    "original_answer": card.get("answer", ""),
+                    "difficulty": card.get("difficulty", "medium"),
+                    "category": card.get("category", "general"),
+                }
+                for offset, card in enumerate(batch)
+            ], indent=1)
+            prompt = f"""You are an expert in cognitive psychology and educational flashcard design. Rewrite each flashcard answer below so it is optimized for memory retention and active recall.
+
+DOCUMENT CONTEXT:
+{document_content[:2000]}
+
+MEMORY OPTIMIZATION RULES:
+1. Keep answers concise (1-2 sentences max) for better recall
+2. Use memory techniques: acronyms, mnemonics, vivid imagery
+3. Include key numbers, dates, or specific facts
+4. Make it testable - avoid vague descriptions
+5. Add context clues that trigger memory
+6. Use active voice and clear language
+7. Include "why" or "how" briefly if it aids memory
+8. For definitions: Term + Key Function + One distinguishing feature
+9. For processes: Number of steps + Key action words
+10. For comparisons: Main difference + One example
+
+DIFFICULTY GUIDELINES:
+- Easy: Simple recall, key facts, basic definitions
+- Medium: Relationships, comparisons, short processes  
+- Hard: Complex concepts, multi-step processes, analysis
+
+FLASHCARDS (JSON):
+{cards_json}
+
+Reply with ONLY a JSON array containing one object per flashcard, in the same order, of the form {{"id": <id>, "answer": "<memory-optimized answer>"}}:"""
+            
+            try:
+                reply = invoke_text(prompt, temperature=0.2, timeout=remaining)
+            except Exception as e:
+                print(f"⚠️ Error enhancing flashcard batch: {e}")
+                continue
+            
+            parsed = _parse_json_array(reply)
+            if parsed is None:
+                print(f"⚠️ Could not parse batch flashcard reply; enhancing {len(batch)} cards individually")
+                continue
+            for item in parsed:
+                if not isinstance(item, dict):
+                    continue
+                try:
+                    card_id = int(item.get("id"))
+                except (TypeError, ValueError):
+                    continue
+                answer = _clean_flashcard_answer(item.get("answer"))
+                if start <= card_id < start + len(batch) and answer:
+                    answers[card_id] = answer
+    
+    # Cards without a valid batched answer go through the per-card path
+    missing = [index for index in range(len(flashcards)) if index not in answers]
+    if missing and len(missing) < len(flashcards):
+        print(f"↪️ {len(missing)} of {len(flashcards)} flashcards need individual enhancement")
+    remaining = max(0.0, expires_at - time.monotonic())
+    retried = enhance_flashcard_answers([flashcards[index] for index in missing], document_content, remaining) if missing else []
+    retried_by_index = dict(zip(missing, retried))
+    
+    return [
+        _enhanced_card(card, answers[index]) if index in answers else retried_by_index[index]
+        for index, card in enumerate(flashcards)
+    ]
+
+def enhance_flashcard_for_memory(question, original_answer, document_content, difficulty, category, timeout=25):
     """Create memory-optimized flashcard answers using AI."""
     try:
-        # Check if Ollama is available
-        import requests
-        try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=2)
-            if response.status_code != 200:
-                return original_answer
-        except:
+        # Cached health state; no per-card probe
+        if not is_llm_available():
             return original_answer
         
-        from langchain_ollama.chat_models import ChatOllama
-        from langchain_core.messages import SystemMessage, HumanMessage
-        
-        # Initialize Ollama model
-        model = ChatOllama(
-            model="llama3",
-            timeout=25,
-            temperature=0.2  # Lower temperature for more consistent, factual responses
-        )
-        
         # Memory-optimized enhancement prompt
         prompt = f"""You are an expert in cognitive psychology and educational flashcard design. Create the perfect flashcard answer optimized for memory retention and active recall.
 
@@ -193,20 +393,12 @@ DIFFICULTY GUIDELINES:
 Create a memory-perfect answer that a student can easily recall during exam pressure:"""
 
         try:
-            enhanced_response = model.invoke(prompt)
+            # Lower temperature for more consistent, factual responses
+            enhanced_response = invoke_text(
+                prompt, temperature=0.2, timeout=timeout, cached=True, accept=_clean_flashcard_answer
+            )
             
-            if enhanced_response and len(enhanced_response.strip()) > 10:
-                # Clean up the response
-                clean_answer = enhanced_response.strip()
-                
-                # Ensure it's not too long (memory principle)
-                sentences = clean_answer.split('.')
-                if len(sentences) > 3:
-                    clean_answer = '. '.join(sentences[:2]).strip() + '.'
-                
-                return clean_answer
-            else:
-                return original_answer
+            return _clean_flashcard_answer(enhanced_response) or original_answer
                 
         except Exception as e:
             print(f"⚠️ Error enhancing flashcard: {e}")
@@ -249,10 +441,16 @@ def get_hardcoded_flashcards_by_domain(domain):
     """Return memory-focused flashcards optimized for recall and revision."""
     return DOMAIN_FLASHCARDS.get(domain, [])
 
-def generate_simple_flashcards(document_chunks, max_cards=15):
-    """Generate domain-specific flashcards with AI-enhanced answers."""
+def generate_simple_flashcards(document_chunks, max_cards=15, cache=None):
+    """Generate domain-specific flashcards with AI-enhanced answers.
+
+    ``cache`` is the (session-scoped) dict results are memoised in; defaults
+    to the process-wide AI cache.
+    """
     if not document_chunks:
         return []
+    if cache is None:
+        cache = _ai_cache
     
     # Combine content from chunks
     combined_content = "\n".join([doc.page_content for doc in document_chunks[:8]])
@@ -264,9 +462,9 @@ def generate_simple_flashcards(document_chunks, max_cards=15):
     # Check cache first
     lock = get_cache_lock()
     with lock:
-        if cache_key in _ai_cache:
+        if cache_key in cache:
             print("🔄 Using cached flashcards")
-            return _ai_cache[cache_key]
+            return cache[cache_key]
     
     # Detect document domain
     domain = detect_document_domain(combined_content)
@@ -600,19 +798,22 @@ def generate_simple_flashcards(document_chunks, max_cards=15):
     
     # ENHANCED: Use AI to improve flashcard answers
     print("🤖 Enhancing flashcard answers with AI...")
-    enhanced_flashcards = enhance_flashcard_answers(final_flashcards, combined_content)
+    if FLASHCARD_ENHANCE_MODE == "batch":
+        enhanced_flashcards = enhance_flashcards_batch(final_flashcards, combined_content)
+    else:
+        enhanced_flashcards = enhance_flashcard_answers(final_flashcards, combined_content)
     
     if enhanced_flashcards:
         print(f"✅ Enhanced {len(enhanced_flashcards)} flashcard answers with AI")
         # Cache the enhanced result
         with lock:
-            _ai_cache[cache_key] = enhanced_flashcards
+            cache[cache_key] = enhanced_flashcards
         return enhanced_flashcards
     else:
         print("⚠️ AI enhancement failed, returning basic flashcards")
         # Cache the basic result
         with lock:
-            _ai_cache[cache_key] = final_flashcards
+            cache[cache_key] = final_flashcards
         return final_flashcards
 
 def detect_document_domain(content):
@@ -639,10 +840,16 @@ def get_hardcoded_questions_by_domain(domain, content_preview=""):
     """Return hardcoded smart questions based on document domain."""
     return DOMAIN_QUESTIONS.get(domain, DOMAIN_QUESTIONS["general"])
 
-def generate_questions_from_content(document_chunks):
-    """Generate intelligent sample questions based on document domain and content analysis."""
+def generate_questions_from_content(document_chunks, cache=None):
+    """Generate intelligent sample questions based on document domain and content analysis.
+
+    ``cache`` is the (session-scoped) dict results are memoised in; defaults
+    to the process-wide AI cache.
+    """
     if not document_chunks:
         return []
+    if cache is None:
+        cache = _ai_cache
     
     # Use more chunks for better analysis (up to 8 chunks)
     combined_content = "\n".join([doc.page_content for doc in document_chunks[:8]])
@@ -654,9 +861,9 @@ def generate_questions_from_content(document_chunks):
     # Check cache first
     lock = get_cache_lock()
     with lock:
-        if cache_key in _ai_cache:
+        if cache_key in cache:
             print("🔄 Using cached smart questions")
-            return _ai_cache[cache_key]
+            return cache[cache_key]
     
     # Detect document domain
     domain = detect_document_domain(combined_content)
@@ -871,7 +1078,7 @@ def generate_questions_from_content(document_chunks):
     
     # Cache the result
     with lock:
-        _ai_cache[cache_key] = final_questions
+        cache[cache_key] = final_questions
     
     return final_questions
 
@@ -911,26 +1118,35 @@ def clear_documents_directory():
         os.makedirs(documents_dir)
         print(f"Created documents directory: {documents_dir}")
 
-def load_documents():
-    """Load documents from various formats (PDF, TXT) - only current uploads."""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    documents_dir = os.path.join(current_dir, "documents")
-    
-    # Create documents directory if it doesn't exist
-    if not os.path.exists(documents_dir):
-        os.makedirs(documents_dir)
-        print(f"Created documents directory: {documents_dir}")
-        return []
+def load_documents(file_paths=None):
+    """Load documents from various formats (PDF, TXT).
+
+    By default every file in the documents directory is loaded; pass
+    ``file_paths`` to load just those files (e.g. a single new upload).
+    """
+    if file_paths is None:
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        documents_dir = os.path.join(current_dir, "documents")
+        
+        # Create documents directory if it doesn't exist
+        if not os.path.exists(documents_dir):
+            os.makedirs(documents_dir)
+            print(f"Created documents directory: {documents_dir}")
+            return []
+        
+        pdf_files = glob.glob(os.path.join(documents_dir, "*.pdf"))
+        txt_files = glob.glob(os.path.join(documents_dir, "*.txt"))
+    else:
+        pdf_files = [path for path in file_paths if path.lower().endswith(".pdf")]
+        txt_files = [path for path in file_paths if path.lower().endswith(".txt")]
     
     all_documents = []
     
     # Load PDF files
-    pdf_files = glob.glob(os.path.join(documents_dir, "*.pdf"))
     for pdf_file in pdf_files:
         try:
             print(f"Loading PDF: {os.path.basename(pdf_file)}")
-            loader = PyPDFLoader(pdf_file)
-            documents = loader.load()
+            documents = load_pdf_pages(pdf_file)
             
             # Validate document content
             valid_documents = []
@@ -948,7 +1164,6 @@ def load_documents():
             print(f"✗ Error loading {pdf_file}: {e}")
     
     # Load text files
-    txt_files = glob.glob(os.path.join(documents_dir, "*.txt"))
     for txt_file in txt_files:
         try:
             print(f"Loading text file: {os.path.basename(txt_file)}")
@@ -1004,10 +1219,167 @@ def clear_vector_store():
         except Exception as e:
             print(f"✗ Error clearing vector store: {e}")
 
-def initialize_vector_store(force_recreate=False):
-    """Initialize the vector store with document chunks."""
+def get_persistent_directory():
+    """Return the directory holding the persistent Chroma store."""
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    persistent_directory = os.path.join(current_dir, "db", "chroma_db")
+    return os.path.join(current_dir, "db", "chroma_db")
+
+def get_keyword_index_path():
+    """Return the path of the default corpus' BM25 keyword index."""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, "db", "bm25_index.json")
+
+def get_text_splitter():
+    """Return the splitter used for every ingested document."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len,
+    )
+
+def split_documents(documents):
+    """Split loaded pages into chunks, dropping any that are empty."""
+    docs = get_text_splitter().split_documents(documents)
+    return [doc for doc in docs if doc.page_content and doc.page_content.strip()]
+
+def embed_and_persist(db, docs, ids=None, progress=None):
+    """Embed chunks in batches and write them to ``db``, reporting embed/persist progress."""
+    if progress is None:
+        progress = lambda stage, fraction=0.0, message=None: None
+
+    # Embed in batches so progress can be reported; the vectors land in
+    # the embedding cache and are picked up again when persisting
+    print("--- Creating embeddings ---")
+    progress("embed", 0.0, f"Embedding {len(docs)} chunks...")
+    embeddings = get_cached_embeddings()
+    texts = [doc.page_content for doc in docs]
+    for start in range(0, len(texts), INGEST_BATCH_SIZE):
+        embeddings.embed_documents(texts[start:start + INGEST_BATCH_SIZE])
+        progress("embed", min(1.0, (start + INGEST_BATCH_SIZE) / len(texts)))
+    print("--- Finished creating embeddings ---")
+
+    print("--- Writing chunks to vector store ---")
+    progress("persist", 0.0, "Saving chunks to the vector store...")
+    for start in range(0, len(docs), INGEST_BATCH_SIZE):
+        batch_ids = ids[start:start + INGEST_BATCH_SIZE] if ids else None
+        db.add_documents(docs[start:start + INGEST_BATCH_SIZE], ids=batch_ids)
+        progress("persist", min(1.0, (start + INGEST_BATCH_SIZE) / len(docs)))
+    print("--- Finished writing vector store ---")
+
+def get_numpy_store_directory(collection_name=DEFAULT_COLLECTION_NAME):
+    """Return the directory holding a NumPy-backed corpus."""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, "db", "numpy_store", collection_name)
+
+def open_vector_store(create=False, collection_name=DEFAULT_COLLECTION_NAME, backend="chroma"):
+    """Open the persisted corpus stored in ``collection_name``.
+
+    ``backend`` selects Chroma or the in-memory NumPy store. Returns
+    (None, None) if nothing has been ingested yet, unless ``create`` is set,
+    in which case an empty store is created.
+    """
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend '{backend}'. Choose one of: {', '.join(VECTOR_BACKENDS)}")
+
+    if backend == "numpy":
+        store_directory = get_numpy_store_directory(collection_name)
+        if not create and not os.path.exists(store_directory):
+            return None, None
+        embeddings = get_cached_embeddings()
+        return NumpyVectorStore.load(store_directory, embeddings), embeddings
+
+    persistent_directory = get_persistent_directory()
+    if not create and not os.path.exists(persistent_directory):
+        return None, None
+    embeddings = get_cached_embeddings()
+    db = Chroma(
+        collection_name=collection_name,
+        persist_directory=persistent_directory,
+        embedding_function=embeddings,
+    )
+    return db, embeddings
+
+def save_vector_store(db):
+    """Flush pending writes for stores that do not persist on every insert."""
+    if isinstance(db, NumpyVectorStore):
+        db.persist()
+
+def reset_vector_store(collection_name=DEFAULT_COLLECTION_NAME, backend="chroma"):
+    """Drop every chunk in ``collection_name`` and return a fresh, empty store."""
+    if backend == "numpy":
+        store_directory = get_numpy_store_directory(collection_name)
+        if os.path.exists(store_directory):
+            shutil.rmtree(store_directory)
+    else:
+        db, _ = open_vector_store(create=True, collection_name=collection_name)
+        db.delete_collection()
+    db, _ = open_vector_store(create=True, collection_name=collection_name, backend=backend)
+    return db
+
+def add_document_to_store(db, file_path, doc_id, progress=None, keyword_index=None, filename=None):
+    """Append one document's chunks to the corpus in ``db``.
+
+    Extraction, splitting, embedding and vector store inserts run as a
+    pipeline, so the first chunks are queryable before the whole file is
+    processed; each chunk is embedded once and written with its vector.
+    Every chunk is tagged with ``doc_id`` (and a ``chunk_id`` that doubles as
+    its Chroma id) so the document can later be filtered on or deleted.
+    Chunks are also added to ``keyword_index`` (a BM25Index) when given.
+    ``filename`` is the name shown for the document (defaults to the file's).
+    Returns the number of chunks added (0 if nothing readable was found).
+    If ingestion fails, every chunk already written for ``doc_id`` is
+    removed again before the error is re-raised.
+    """
+    filename = filename or os.path.basename(file_path)
+    embeddings = get_cached_embeddings()
+    reused, embedded = embeddings.documents_reused, embeddings.documents_embedded
+    pipeline = IngestPipeline(
+        db,
+        embeddings,
+        get_text_splitter(),
+        batch_size=INGEST_BATCH_SIZE,
+        progress=progress,
+        keyword_index=keyword_index,
+    )
+    try:
+        chunk_count = pipeline.run(file_path, doc_id, filename)
+    except Exception as e:
+        print(f"❌ Ingestion of {filename} failed, removing its partial chunks: {e}")
+        delete_document_from_store(db, doc_id, keyword_index=keyword_index)
+        raise
+    # Counters are shared, so an ingest running alongside is included too
+    print(
+        f"🧮 Embedding cache: {embeddings.documents_reused - reused} reused, "
+        f"{embeddings.documents_embedded - embedded} newly embedded"
+    )
+    save_vector_store(db)
+    if keyword_index is not None:
+        keyword_index.save()
+    if chunk_count == 0:
+        print(f"❌ No readable text found in {filename}.")
+    return chunk_count
+
+def delete_document_from_store(db, doc_id, keyword_index=None):
+    """Remove every chunk belonging to ``doc_id`` from the corpus (and its keyword index)."""
+    if keyword_index is not None:
+        keyword_index.remove_document(doc_id)
+        keyword_index.save()
+    if db is None:
+        return
+    db.delete(where={"doc_id": doc_id})
+    save_vector_store(db)
+    print(f"🗑️ Removed chunks for document {doc_id}")
+
+def initialize_vector_store(force_recreate=False, progress=None):
+    """Initialize the vector store with document chunks.
+
+    ``progress`` is an optional ``progress(stage, fraction)`` callback that is
+    told how far the load, split, embed and persist stages have got.
+    """
+    if progress is None:
+        progress = lambda stage, fraction=0.0, message=None: None
+
+    persistent_directory = get_persistent_directory()
     
     # If force_recreate is True or no store exists, create new one
     if force_recreate or not os.path.exists(persistent_directory):
@@ -1018,36 +1390,22 @@ def initialize_vector_store(force_recreate=False):
             print("Persistent directory does not exist. Initializing vector store...")
         
         # Load documents from various sources
+        progress("load", 0.0, "Extracting text from document...")
         documents = load_documents()
         
         if not documents:
             print("No documents to process. Vector store not created.")
             return None, None
+        progress("load", 1.0)
         
         # Split the documents into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
-        docs = text_splitter.split_documents(documents)
+        progress("split", 0.0, "Splitting document into chunks...")
+        docs = split_documents(documents)
         
-        # Validate that we have content after splitting
         if not docs:
-            print("❌ No document chunks created after splitting. Documents might be empty or corrupted.")
-            return None, None
-        
-        # Filter out empty chunks
-        valid_docs = []
-        for doc in docs:
-            if doc.page_content and doc.page_content.strip():
-                valid_docs.append(doc)
-        
-        if not valid_docs:
-            print("❌ No valid document chunks found. All chunks are empty.")
+            print("❌ No valid document chunks found. Documents might be empty or corrupted.")
             return None, None
-        
-        docs = valid_docs
+        progress("split", 1.0)
         
         # Display information about the split documents
         print(f"\n--- Document Chunks Information ---")
@@ -1055,20 +1413,24 @@ def initialize_vector_store(force_recreate=False):
         print(f"Total documents processed: {len(documents)}")
         print(f"Sample chunk preview:\n{docs[0].page_content[:300]}...\n")
         
-        # Create embeddings
-        print("--- Creating embeddings ---")
-        try:
-            embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        except Exception as e:
-            print(f"❌ Error creating embeddings: {e}")
-            return None, None
-        print("--- Finished creating embeddings ---")
+        # Give every chunk an id so the keyword index can refer back to it
+        ids = []
+        for i, doc in enumerate(docs):
+            doc.metadata["chunk_id"] = f"chunk:{i}"
+            ids.append(doc.metadata["chunk_id"])
         
-        # Create the vector store and persist it automatically
-        print("--- Creating vector store ---")
+        # Reuse the shared embedding model; chunks seen before come from the cache
+        embeddings = get_cached_embeddings()
         try:
-            db = Chroma.from_documents(docs, embeddings, persist_directory=persistent_directory)
-            print("--- Finished creating vector store ---")
+            db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
+            embed_and_persist(db, docs, ids=ids, progress=progress)
+            
+            # Build the BM25 inverted index used by hybrid retrieval
+            keyword_index = BM25Index(get_keyword_index_path())
+            keyword_index.clear()
+            keyword_index.add_documents(docs)
+            keyword_index.save()
+            print(f"🔎 Keyword index built over {len(keyword_index)} chunks")
         except Exception as e:
             print(f"❌ Error creating vector store: {e}")
             print("This might be due to empty or invalid document content.")
@@ -1077,9 +1439,7 @@ def initialize_vector_store(force_recreate=False):
         return db, embeddings
     else:
         print("Vector store already exists. Loading existing store...")
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
-        return db, embeddings
+        return open_vector_store()
 
 def analyze_query_type(query):
     """Analyze the query to determine the appropriate retrieval strategy."""
@@ -1179,39 +1539,257 @@ def calculate_dynamic_k(total_chunks, query_type, query_length):
     
     return k
 
-def query_documents(db, query, use_llm=True):
-    """Query the vector store and use LLM to generate response based on retrieved content with dynamic k."""
-    
+def count_chunks(db, doc_ids=None, registry=None):
+    """Return the number of chunks in scope without running a search.
+
+    Uses the registry's ingest-time counts when available, otherwise the
+    store's own count (whole corpus only).
+    """
+    try:
+        if registry is not None:
+            return registry.chunk_count(doc_ids)
+        if isinstance(db, NumpyVectorStore):
+            return db.count()
+        return db._collection.count()
+    except Exception as e:
+        print(f"⚠️ Could not read chunk count: {e}")
+        return 10  # Safe fallback
+
+def build_document_filter(doc_ids):
+    """Build a Chroma metadata filter restricting results to the given documents."""
+    if not doc_ids:
+        return None
+    if len(doc_ids) == 1:
+        return {"doc_id": doc_ids[0]}
+    return {"doc_id": {"$in": list(doc_ids)}}
+
+def source_name(doc):
+    """Display name of the document a chunk came from (not its on-disk file name)."""
+    return doc.metadata.get("filename") or os.path.basename(doc.metadata.get("source", "Unknown source"))
+
+def _chunk_key(doc):
+    """Identity used to dedup retrieved chunks (content prefix for chunks ingested without ids)."""
+    return doc.metadata.get("chunk_id") or getattr(doc, "id", None) or hash(doc.page_content[:100])
+
+def search_by_vectors(db, vectors, k, search_filter=None, include_embeddings=False):
+    """Run several vector searches in one pass, returning a Document list per query.
+
+    With ``include_embeddings`` each query's result is ``(docs, embedding matrix)``.
+    """
+    if isinstance(db, NumpyVectorStore):
+        hits = db.search_by_vectors(vectors, k=k, filter=search_filter)
+        results = []
+        for query_hits in hits:
+            rows = [row for row, _ in query_hits]
+            docs = [db.document_at(row) for row in rows]
+            results.append((docs, db.vectors_at(rows)) if include_embeddings else docs)
+        return results
+
+    # Chroma accepts every query embedding in a single collection query
+    include = ["documents", "metadatas", "embeddings"] if include_embeddings else ["documents", "metadatas"]
+    query_kwargs = {"query_embeddings": vectors, "n_results": k, "include": include}
+    if search_filter:
+        query_kwargs["where"] = search_filter
+    result = db._collection.query(**query_kwargs)
+    results = []
+    for index, (ids, texts, metadatas) in enumerate(zip(result["ids"], result["documents"], result["metadatas"])):
+        docs = [
+            Document(page_content=text, metadata=metadata or {}, id=chunk_id)
+            for chunk_id, text, metadata in zip(ids, texts, metadatas)
+        ]
+        results.append((docs, np.asarray(result["embeddings"][index], dtype=np.float32)) if include_embeddings else docs)
+    return results
+
+def mmr_retrieve(db, queries, k, fetch_k=None, lambda_mult=MMR_LAMBDA, search_filter=None):
+    """Retrieve ``k`` relevant but mutually diverse chunks for one or more queries.
+
+    Pools the top ``fetch_k`` hits of every query (deduped by chunk id), then
+    runs maximal marginal relevance over their stored embeddings.
+    """
+    if not queries:
+        return []
+    fetch_k = fetch_k or max(3 * k, 20)
+    query_vectors = get_cached_embeddings().embed_queries(queries)
+    results = search_by_vectors(db, query_vectors, fetch_k, search_filter, include_embeddings=True)
+
+    pool_docs, pool_vectors, seen = [], [], set()
+    for docs, vectors in results:
+        for doc, vector in zip(docs, vectors):
+            key = _chunk_key(doc)
+            if key not in seen:
+                seen.add(key)
+                pool_docs.append(doc)
+                pool_vectors.append(vector)
+    if not pool_docs:
+        return []
+    selected = max_marginal_relevance(query_vectors, np.vstack(pool_vectors), k, lambda_mult)
+    return [pool_docs[index] for index in selected]
+
+def multi_query_retrieve(db, queries, k, per_query=None, limit=None, search_filter=None, selection="similarity"):
+    """Retrieve chunks for several queries with one batched embed and one search.
+
+    Takes the top ``per_query`` hits of each query in turn, drops chunks already
+    seen (by chunk id) and returns at most ``limit`` chunks. With
+    ``selection="mmr"`` the ``limit`` (or ``k``) chunks are instead chosen by
+    maximal marginal relevance from each query's top ``k``.
+    """
+    if not queries:
+        return []
+    if selection == "mmr":
+        return mmr_retrieve(db, queries, limit or k, fetch_k=k, search_filter=search_filter)
+    vectors = get_cached_embeddings().embed_queries(queries)
+    results = search_by_vectors(db, vectors, k, search_filter)
+
+    unique_docs = []
+    seen = set()
+    for docs in results:
+        for doc in docs[:per_query or k]:
+            key = _chunk_key(doc)
+            if key not in seen:
+                seen.add(key)
+                unique_docs.append(doc)
+    return unique_docs[:limit] if limit else unique_docs
+
+def fetch_chunks(db, chunk_ids):
+    """Load chunks from the vector store by chunk id, preserving the requested order."""
+    if not chunk_ids:
+        return []
+    result = db.get(ids=list(chunk_ids), include=["documents", "metadatas"])
+    by_id = {
+        chunk_id: Document(page_content=text, metadata=metadata or {}, id=chunk_id)
+        for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+    }
+    return [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+
+def _hybrid_candidates(k):
+    return max(3 * k, 10)
+
+def _mmr_candidates(k):
+    return max(3 * k, 20)
+
+def fuse_rankings(db, vector_docs, keyword_hits, k):
+    """Reciprocal rank fusion of a vector ranking and a BM25 ranking; returns the top ``k`` chunks."""
+    fused = {}
+    docs_by_key = {}
+    for rank, doc in enumerate(vector_docs):
+        key = _chunk_key(doc)
+        docs_by_key[key] = doc
+        fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+    for rank, (chunk_id, _) in enumerate(keyword_hits):
+        fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+    ranked = sorted(fused, key=fused.get, reverse=True)[:k]
+    # Chunks found only by keyword still need their text from the store
+    missing = [key for key in ranked if key not in docs_by_key]
+    docs_by_key.update((_chunk_key(doc), doc) for doc in fetch_chunks(db, missing))
+    return [docs_by_key[key] for key in ranked if key in docs_by_key]
+
+def hybrid_retrieve(db, query, k, keyword_index, doc_ids=None, search_filter=None, candidates=None):
+    """Fuse BM25 and vector rankings with reciprocal rank fusion and return the top ``k`` chunks."""
+    candidates = candidates or _hybrid_candidates(k)
+    vector_docs = db.similarity_search(query, k=candidates, filter=search_filter)
+    keyword_hits = keyword_index.search(query, k=candidates, doc_ids=doc_ids)
+    return fuse_rankings(db, vector_docs, keyword_hits, k)
+
+def plan_retrieval(db, query, doc_ids=None, registry=None, keyword_index=None, retrieval_mode=None):
+    """Classify the query and size its retrieval: returns ``(query_type, k, retrieval_mode, total_chunks)``."""
     # Analyze query type and calculate dynamic k
     query_type = analyze_query_type(query)
     
-    # Get total number of chunks in the database (approximate)
-    try:
-        # Get a large sample to estimate total chunks
-        temp_retriever = db.as_retriever(search_kwargs={"k": 100})
-        temp_results = temp_retriever.invoke("sample query for counting")
-        total_chunks = len(temp_results) if temp_results else 10  # fallback estimate
-        # For more accurate count, we use this as an approximation
-        if len(temp_results) == 100:
-            total_chunks = 100  # We hit the limit, likely more chunks
-    except:
-        total_chunks = 10  # Safe fallback
+    # Exact number of chunks in scope, maintained at ingest time
+    total_chunks = count_chunks(db, doc_ids, registry)
     
     # Calculate optimal k
     k = calculate_dynamic_k(total_chunks, query_type, len(query))
     
+    retrieval_mode = retrieval_mode or DEFAULT_RETRIEVAL_MODE
+    if retrieval_mode == "hybrid" and (keyword_index is None or not len(keyword_index)):
+        retrieval_mode = "vector"
+    if retrieval_mode == "hybrid":
+        # Fused rankings put exact-term matches first, so fewer chunks are needed
+        k = max(1, math.ceil(k * HYBRID_K_RATIO))
+    return query_type, k, retrieval_mode, total_chunks
+
+def retrieve_batch(db, queries, ks, retrieval_mode, keyword_index=None, doc_ids=None):
+    """Retrieve chunks for many questions with one batched embed and one vector search.
+
+    ``ks`` holds each question's k. Every question is searched for the largest
+    candidate pool any of them needs and then cut down (vector), fused with
+    its BM25 ranking (hybrid) or MMR-selected (mmr) individually.
+    """
+    if not queries:
+        return []
+    search_filter = build_document_filter(doc_ids)
+    if retrieval_mode == "hybrid":
+        fetch_k = max(_hybrid_candidates(k) for k in ks)
+    elif retrieval_mode == "mmr":
+        fetch_k = max(_mmr_candidates(k) for k in ks)
+    else:
+        fetch_k = max(ks)
+
+    vectors = get_cached_embeddings().embed_queries(queries)
+    results = search_by_vectors(db, vectors, fetch_k, search_filter, include_embeddings=retrieval_mode == "mmr")
+
+    batch_docs = []
+    for query, vector, k, result in zip(queries, vectors, ks, results):
+        if retrieval_mode == "hybrid":
+            candidates = _hybrid_candidates(k)
+            keyword_hits = keyword_index.search(query, k=candidates, doc_ids=doc_ids)
+            batch_docs.append(fuse_rankings(db, result[:candidates], keyword_hits, k))
+        elif retrieval_mode == "mmr":
+            docs, doc_vectors = result
+            if not docs:
+                batch_docs.append([])
+                continue
+            candidates = _mmr_candidates(k)
+            selected = max_marginal_relevance([vector], doc_vectors[:candidates], k, MMR_LAMBDA)
+            batch_docs.append([docs[index] for index in selected])
+        else:
+            batch_docs.append(result[:k])
+    return batch_docs
+
+def retrieve_documents(db, query, k, retrieval_mode, keyword_index=None, doc_ids=None):
+    """Fetch the ``k`` chunks for ``query`` with the planned retrieval mode."""
+    search_filter = build_document_filter(doc_ids)
+    if retrieval_mode == "hybrid":
+        return hybrid_retrieve(db, query, k, keyword_index, doc_ids, search_filter)
+    if retrieval_mode == "mmr":
+        return mmr_retrieve(db, [query], k, search_filter=search_filter)
+    retriever = db.as_retriever(
+        search_type="similarity",
+        search_kwargs={"k": k, "filter": search_filter}
+    )
+    return retriever.invoke(query)
+
+def format_context(relevant_docs):
+    """Number the retrieved sections for the answer prompt."""
+    return "\n\n".join([f"Section {i+1}:\n{doc.page_content}" for i, doc in enumerate(relevant_docs)])
+
+def query_documents(db, query, use_llm=True, doc_ids=None, registry=None, keyword_index=None, retrieval_mode=None, relevant_docs=None):
+    """Query the vector store and use LLM to generate response based on retrieved content with dynamic k.
+
+    ``doc_ids`` optionally restricts retrieval to chunks from those documents.
+    ``registry`` (a DocumentRegistry) supplies exact chunk counts for sizing k.
+    ``retrieval_mode`` is "vector", "hybrid" or "mmr"; hybrid needs a
+    ``keyword_index`` (BM25Index) and falls back to vector search without one.
+    ``relevant_docs`` skips retrieval when the chunks were already fetched
+    (batch queries retrieve for all questions at once).
+    """
+    query_type, k, retrieval_mode, total_chunks = plan_retrieval(
+        db, query, doc_ids, registry, keyword_index, retrieval_mode
+    )
+    
     print(f"🔍 Query Analysis:")
     print(f"   Type: {query_type}")
-    print(f"   Document chunks: ~{total_chunks}")
-    print(f"   Retrieving top {k} most relevant sections")
+    print(f"   Document chunks: {total_chunks}")
+    print(f"   Retrieving top {k} most relevant sections ({retrieval_mode})")
     print("-" * 40)
     
     # Retrieve relevant documents based on the dynamic k
-    retriever = db.as_retriever(
-        search_type="similarity",
-        search_kwargs={"k": k}
-    )
-    relevant_docs = retriever.invoke(query)
+    if relevant_docs is not None:
+        k = len(relevant_docs)
+    else:
+        relevant_docs = retrieve_documents(db, query, k, retrieval_mode, keyword_index, doc_ids)
     
     if not relevant_docs:
         print("No relevant documents found for your question.")
@@ -1231,10 +1809,7 @@ def query_documents(db, query, use_llm=True):
         print(f"   {content}")
         
         if doc.metadata and 'source' in doc.metadata:
-            source = doc.metadata['source']
-            # Show just the filename, not the full path
-            filename = os.path.basename(source)
-            print(f"    Source: {filename}")
+            print(f"    Source: {source_name(doc)}")
     
     # Always try to use LLM to generate response based on retrieved content
     if relevant_docs:
@@ -1242,7 +1817,7 @@ def query_documents(db, query, use_llm=True):
         print("-" * 40)
         
         # Adapt the prompt based on query type
-        context_content = "\n\n".join([f"Section {i+1}:\n{doc.page_content}" for i, doc in enumerate(relevant_docs)])
+        context_content = format_context(relevant_docs)
         
         # Customize prompt based on query type
         if query_type == "summary":
@@ -1297,6 +1872,7 @@ def query_documents(db, query, use_llm=True):
                 "source_documents": relevant_docs,
                 "query_type": query_type,
                 "k_used": k,
+                "retrieval_mode": retrieval_mode,
                 "method": "ai_enhanced",
                 "basic_response": fallback_response  # Keep basic response for comparison
             }
@@ -1319,6 +1895,7 @@ def query_documents(db, query, use_llm=True):
                 "source_documents": relevant_docs,
                 "query_type": query_type,
                 "k_used": k,
+                "retrieval_mode": retrieval_mode,
                 "method": "ai_fallback",
                 "basic_response": fallback_response
             }
@@ -1349,8 +1926,7 @@ def generate_fallback_response(query, relevant_docs, query_type="general"):
     
     for i, doc in enumerate(relevant_docs, 1):
         content = doc.page_content.strip()
-        source = doc.metadata.get('source', 'Unknown source')
-        filename = os.path.basename(source)
+        filename = source_name(doc)
         
         # Adjust content length based on query type
         max_length = {
@@ -1410,7 +1986,7 @@ def main():
         # Check if Ollama is available
         ollama_available = True
         try:
-            model = ChatOllama(model="llama3")
+            model = get_chat_model()
             # Test with a simple query
             test_result = model.invoke([HumanMessage(content="Hello")])
             print(" AI Assistant: ON (Ollama + Llama3)")
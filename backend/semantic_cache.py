@@ -0,0 +1,109 @@
+"""
+Semantic answer cache for /query.
+Stores (question embedding, corpus version, answer) and serves a cached
+answer when a new question is close enough in cosine similarity, so
+rephrasings of the same question skip retrieval and the LLM call. Cached
+question vectors live in one normalised float32 matrix, so a lookup is a
+single matrix-vector product.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+ANSWER_CACHE_SIZE = int(os.environ.get("EDUFY_ANSWER_CACHE_SIZE", "1000"))
+# Minimum cosine similarity between two questions for them to share an answer
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("EDUFY_ANSWER_CACHE_THRESHOLD", "0.92"))
+
+class SemanticAnswerCache:
+    """Bounded nearest-neighbour cache of answers keyed by question embedding and scope.
+
+    ``scope`` is any hashable describing what the answer depends on besides the
+    question (corpus version, document filter, retrieval mode); only entries
+    with the same scope can match.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, threshold=ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._scope_ids = {}
+        self._entry_scopes = np.zeros(0, dtype=np.int64)
+        self._answers = []
+        self._last_used = np.zeros(0, dtype=np.float64)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, question_vector, scope):
+        """Return ``(answer, similarity)`` for the closest cached question in ``scope``, or None."""
+        query = self._normalize(question_vector)
+        with self._lock:
+            scope_id = self._scope_ids.get(scope)
+            if not self._answers or scope_id is None:
+                self.misses += 1
+                return None
+            size = len(self._answers)
+            similarities = self._vectors[:size] @ query
+            similarities = np.where(self._entry_scopes[:size] == scope_id, similarities, -1.0)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._last_used[best] = time.monotonic()
+            return self._answers[best], float(similarities[best])
+
+    def store(self, question_vector, scope, answer):
+        """Cache ``answer``, evicting the least recently used entry when full."""
+        vector = self._normalize(question_vector)
+        with self._lock:
+            size = len(self._answers)
+            if self._vectors is None:
+                capacity = min(64, self.max_entries)
+                self._vectors = np.zeros((capacity, vector.shape[0]), dtype=np.float32)
+                self._entry_scopes = np.zeros(capacity, dtype=np.int64)
+                self._last_used = np.zeros(capacity, dtype=np.float64)
+            scope_id = self._scope_ids.setdefault(scope, len(self._scope_ids))
+
+            if size >= self.max_entries:
+                row = int(np.argmin(self._last_used[:size]))
+                self._answers[row] = answer
+            else:
+                if size == self._vectors.shape[0]:
+                    extra = min(self.max_entries, 2 * size) - size
+                    self._vectors = np.concatenate([self._vectors, np.zeros((extra, vector.shape[0]), dtype=np.float32)])
+                    self._entry_scopes = np.concatenate([self._entry_scopes, np.zeros(extra, dtype=np.int64)])
+                    self._last_used = np.concatenate([self._last_used, np.zeros(extra)])
+                row = size
+                self._answers.append(answer)
+            self._vectors[row] = vector
+            self._entry_scopes[row] = scope_id
+            self._last_used[row] = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._vectors = None
+            self._scope_ids = {}
+            self._entry_scopes = np.zeros(0, dtype=np.int64)
+            self._answers = []
+            self._last_used = np.zeros(0, dtype=np.float64)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "size": len(self._answers),
+                "max_size": self.max_entries,
+                "threshold": self.threshold,
+            }
@@ -0,0 +1,235 @@
+"""
+Per-session (per-student) state.
+Each session gets its own vector store (Chroma or in-memory NumPy), documents
+directory, document registry, keyword index, precomputed study material, AI
+cache and upload state. Open sessions are kept in a bounded LRU; idle ones
+are evicted from memory but stay on disk and reopen on next use.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from bm25_index import BM25Index
+from document_registry import DocumentRegistry, DEFAULT_REGISTRY_PATH
+from semantic_cache import SemanticAnswerCache
+from study_artifacts import ArtifactStore
+from rag import DEFAULT_COLLECTION_NAME, DEFAULT_VECTOR_BACKEND, VECTOR_BACKENDS, open_vector_store, reset_vector_store
+
+SESSION_HEADER = "X-Session-Id"
+DEFAULT_SESSION_ID = "default"
+MAX_OPEN_SESSIONS = int(os.environ.get("EDUFY_MAX_OPEN_SESSIONS", "64"))
+
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Session:
+    """Everything that belongs to one student's corpus."""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        if session_id == DEFAULT_SESSION_ID:
+            # The default session keeps the original single-user layout
+            self.key = DEFAULT_SESSION_ID
+            self.collection_name = DEFAULT_COLLECTION_NAME
+            self.documents_dir = os.path.join(_BACKEND_DIR, "documents")
+            self.data_dir = os.path.dirname(DEFAULT_REGISTRY_PATH)
+        else:
+            # Hash the id so it is always a valid collection / directory name
+            self.key = hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:16]
+            self.collection_name = f"session_{self.key}"
+            self.documents_dir = os.path.join(_BACKEND_DIR, "documents", "sessions", self.key)
+            self.data_dir = os.path.join(_BACKEND_DIR, "db", "sessions", self.key)
+
+        self.registry = DocumentRegistry(os.path.join(self.data_dir, "documents.json"))
+        self.keyword_index = BM25Index(os.path.join(self.data_dir, "bm25_index.json"))
+        self.artifacts = ArtifactStore(os.path.join(self.data_dir, "study_artifacts.json"))
+        self.settings_path = os.path.join(self.data_dir, "settings.json")
+        self.vector_backend = self._load_settings().get("vector_backend", DEFAULT_VECTOR_BACKEND)
+        self.ai_cache = {}
+        self.answer_cache = SemanticAnswerCache()
+        self.document_state = {
+            "last_upload_time": 0,
+            "current_filename": "",
+            "content_ready": True,
+            "upload_complete": False
+        }
+        self.active_jobs = 0
+        # Queued uploads, deletions and backend switches; each ends by rebuilding
+        # the study artifacts, so requests do not generate them meanwhile
+        self.corpus_jobs = 0
+        self.last_used = time.time()
+        self._db = None
+        self._lock = threading.Lock()
+        # Separate from _lock, which is held while a store opens, so busy
+        # checks during eviction never wait on that
+        self._jobs_lock = threading.Lock()
+        # Held by every corpus change (ingest, delete, backend switch) so they
+        # never interleave in the ingestion pool
+        self.corpus_lock = threading.RLock()
+
+    def get_db(self, create=False):
+        """Return this session's vector store, opening it lazily.
+
+        Returns None when the session has no documents, unless ``create`` is set.
+        """
+        if self._db is None:
+            with self._lock:
+                if self._db is None and (create or self.registry.list_documents()):
+                    self._db, _ = open_vector_store(
+                        create=True,
+                        collection_name=self.collection_name,
+                        backend=self.vector_backend,
+                    )
+        return self._db
+
+    def _load_settings(self):
+        if not os.path.exists(self.settings_path):
+            return {}
+        try:
+            with open(self.settings_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"⚠️ Could not read session settings: {e}")
+            return {}
+
+    def _save_settings(self):
+        os.makedirs(self.data_dir, exist_ok=True)
+        temp_path = self.settings_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"vector_backend": self.vector_backend}, f, indent=2)
+        os.replace(temp_path, self.settings_path)
+
+    def switch_vector_backend(self, backend, add_document):
+        """Move the corpus to another vector store backend.
+
+        The new store is rebuilt from the registered document files with
+        ``add_document(db, file_path, doc_id, filename=...)`` (embeddings come from the
+        cache), then swapped in. Holds ``corpus_lock`` throughout, so uploads and
+        deletions wait and then apply to the new store. Returns the number of
+        chunks rebuilt.
+        """
+        if backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown vector backend '{backend}'. Choose one of: {', '.join(VECTOR_BACKENDS)}")
+        with self.corpus_lock:
+            if backend == self.vector_backend:
+                return self.registry.total_chunks()
+
+            db = reset_vector_store(self.collection_name, backend)
+            chunk_count = 0
+            for entry in self.registry.list_documents():
+                chunk_count += add_document(db, entry["path"], entry["doc_id"], filename=entry.get("filename"))
+
+            with self._lock:
+                self._db = db
+                self.vector_backend = backend
+                self._save_settings()
+        print(f"🔀 Session {self.key} now uses the {backend} vector store ({chunk_count} chunks)")
+        return chunk_count
+
+    @property
+    def db(self):
+        return self.get_db()
+
+    def begin_job(self, corpus=False):
+        """Mark work in flight (a request, background job or streaming response) so the session stays resident.
+
+        ``corpus`` marks a background job that changes the corpus or its study artifacts.
+        """
+        with self._jobs_lock:
+            self.active_jobs += 1
+            if corpus:
+                self.corpus_jobs += 1
+
+    def end_job(self, corpus=False):
+        with self._jobs_lock:
+            self.active_jobs -= 1
+            if corpus:
+                self.corpus_jobs -= 1
+
+    def claim_artifact_refresh(self):
+        """Begin a corpus job for an artifact refresh, unless one is already queued.
+
+        Returns True when the caller should submit the refresh (and later call
+        ``end_job(corpus=True)``).
+        """
+        with self._jobs_lock:
+            if self.corpus_jobs:
+                return False
+            self.active_jobs += 1
+            self.corpus_jobs += 1
+            return True
+
+    @contextmanager
+    def busy(self):
+        """Hold the session resident for the duration of the ``with`` block."""
+        self.begin_job()
+        try:
+            yield self
+        finally:
+            self.end_job()
+
+    def is_busy(self):
+        with self._jobs_lock:
+            return self.active_jobs > 0
+
+    def close(self):
+        """Release in-memory state; everything persisted stays on disk."""
+        self._db = None
+        self.ai_cache.clear()
+        self.answer_cache.clear()
+
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+def is_valid_session_id(session_id):
+    return bool(session_id) and bool(_SESSION_ID_PATTERN.match(session_id))
+
+def get_session(session_id=None, begin_job=False):
+    """Return the open session for ``session_id``, (re)opening it if needed.
+
+    With ``begin_job`` the session is marked busy before the sessions lock is
+    released, so eviction cannot slip in between; the caller must call
+    ``end_job()``.
+    """
+    session_id = session_id or DEFAULT_SESSION_ID
+    if not is_valid_session_id(session_id):
+        raise ValueError(f"Invalid session id '{session_id}'")
+
+    with _sessions_lock:
+        session = _sessions.get(session_id)
+        if session is None:
+            session = Session(session_id)
+            _sessions[session_id] = session
+        _sessions.move_to_end(session_id)
+        session.last_used = time.time()
+        if begin_job:
+            session.begin_job()
+        _evict_idle_sessions()
+    return session
+
+def _evict_idle_sessions():
+    """Close least-recently-used sessions beyond MAX_OPEN_SESSIONS (lock held).
+
+    Sessions with a request or background job in flight are never evicted.
+    """
+    if len(_sessions) <= MAX_OPEN_SESSIONS:
+        return
+    for session_id in list(_sessions):
+        if len(_sessions) <= MAX_OPEN_SESSIONS:
+            break
+        session = _sessions[session_id]
+        if session.is_busy():
+            continue
+        _sessions.pop(session_id)
+        session.close()
+        print(f"💤 Evicted idle session {session.key} from memory")
+
+def open_session_count():
+    with _sessions_lock:
+        return len(_sessions)
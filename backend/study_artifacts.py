@@ -0,0 +1,101 @@
+"""
+Precomputed flashcards and sample questions.
+Generation (retrieval, term extraction and LLM enhancement) runs once as a
+post-ingest stage; the results are stored with the corpus version they were
+built from, so /flashcards and /sample-questions just read them back.
+"""
+
+import json
+import os
+import threading
+import time
+
+from rag import generate_questions_from_content, generate_simple_flashcards, multi_query_retrieve
+
+FLASHCARD_QUERIES = ["main topics concepts definitions"]
+QUESTION_QUERIES = [
+    "main concepts definitions important terms",
+    "key topics processes methods procedures",
+    "examples applications case studies",
+    "principles fundamentals basics overview",
+]
+
+def build_flashcards(db, cache=None):
+    # 8 mutually diverse chunks out of the top 30, rather than 10 near-duplicates
+    sample_docs = multi_query_retrieve(db, FLASHCARD_QUERIES, k=30, limit=8, selection="mmr")
+    return generate_simple_flashcards(sample_docs, cache=cache) if sample_docs else []
+
+def build_questions(db, cache=None):
+    # 10 chunks covering all four aspects, chosen by MMR from each query's top 15
+    sample_docs = multi_query_retrieve(db, QUESTION_QUERIES, k=15, limit=10, selection="mmr")
+    return generate_questions_from_content(sample_docs, cache=cache) if sample_docs else []
+
+class ArtifactStore:
+    """JSON file holding the flashcards and questions generated for one corpus version."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._artifacts = None
+
+    def _read(self):
+        if self._artifacts is None:
+            artifacts = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        artifacts = json.load(f)
+                except Exception as e:
+                    print(f"⚠️ Could not read study artifacts: {e}")
+            self._artifacts = artifacts
+        return self._artifacts
+
+    def get(self, version):
+        """Return the stored artifacts if they were built for ``version``, else None."""
+        with self._lock:
+            artifacts = self._read()
+        return artifacts if artifacts.get("version") == version else None
+
+    def put(self, version, flashcards, questions):
+        artifacts = {
+            "version": version,
+            "flashcards": flashcards,
+            "questions": questions,
+            "generated_at": time.time(),
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(artifacts, f, indent=2)
+            os.replace(temp_path, self.path)
+            self._artifacts = artifacts
+        return artifacts
+
+    def clear(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._artifacts = {}
+
+def materialize_study_artifacts(db, registry, store, cache=None):
+    """Generate and store flashcards and questions for the corpus as it is now.
+
+    If the corpus changes while generating, the result is discarded; the
+    ingestion that changed it materialises its own version.
+    """
+    version = registry.version()
+    if db is None or not registry.list_documents():
+        store.clear()
+        return None
+
+    start_time = time.time()
+    flashcards = build_flashcards(db, cache=cache)
+    questions = build_questions(db, cache=cache)
+
+    if registry.version() != version:
+        print("↪️ Corpus changed while generating study material; keeping the newer run")
+        return None
+    artifacts = store.put(version, flashcards, questions)
+    print(f"🃏 Materialised {len(flashcards)} flashcards and {len(questions)} questions in {time.time() - start_time:.1f}s")
+    return artifacts
@@ -0,0 +1,38 @@
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from ingest_pipeline import IngestPipeline
+from numpy_store import NumpyVectorStore
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    """Fake embedding that records how many texts it was asked to embed."""
+
+    embedded: int = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+def test_pipeline_embeds_each_chunk_once(tmp_path):
+    file_path = tmp_path / "notes.txt"
+    file_path.write_text("".join(f"Line {i} about routing tables and subnets.\n" for i in range(200)), encoding="utf-8")
+
+    store_embeddings = CountingEmbedding(size=32)
+    pipeline_embeddings = CountingEmbedding(size=32)
+    store = NumpyVectorStore(store_embeddings, persist_directory=str(tmp_path / "store"))
+    pipeline = IngestPipeline(
+        store,
+        pipeline_embeddings,
+        RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=0),
+        batch_size=8,
+    )
+
+    chunk_count = pipeline.run(str(file_path), "doc", "notes.txt")
+
+    assert chunk_count > 8
+    assert store.count() == chunk_count
+    assert pipeline_embeddings.embedded == chunk_count
+    # Persisting writes the pipeline's vectors instead of embedding again
+    assert store_embeddings.embedded == 0
+    hit = store.similarity_search("Line 3 about routing tables and subnets.", k=1)[0]
+    assert hit.metadata["doc_id"] == "doc" and hit.metadata["filename"] == "notes.txt"
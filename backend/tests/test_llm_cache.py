@@ -0,0 +1,87 @@
+import pytest
+
+import llm_cache
+import llm_client
+from llm_cache import LLMResponseCache
+
+class Reply:
+    def __init__(self, content):
+        self.content = content
+
+class StubChatModel:
+    """Chat model that answers from a list of replies and counts its calls."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        return Reply(self.replies.pop(0))
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    return now
+
+@pytest.fixture
+def response_cache(tmp_path, monkeypatch):
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(llm_client, "_response_cache", cache)
+    return cache
+
+def stub_model(monkeypatch, temperature, replies):
+    model = StubChatModel(replies)
+    monkeypatch.setitem(llm_client._models, temperature, model)
+    return model
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite3"), ttl_seconds=60)
+    cache.put("key", "reply")
+
+    clock[0] += 59
+    assert cache.get("key") == "reply"
+
+    clock[0] += 2
+    assert cache.get("key") is None
+    # Expired rows are dropped on the next write
+    cache.put("other", "reply")
+    assert cache.stats()["size"] == 1
+
+def test_least_recently_used_entries_are_trimmed(tmp_path, clock):
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite3"), max_entries=2)
+    cache.put("first", "1")
+    clock[0] += 1
+    cache.put("second", "2")
+    clock[0] += 1
+    assert cache.get("first") == "1"  # now more recent than "second"
+    clock[0] += 1
+    cache.put("third", "3")
+
+    assert cache.stats()["size"] == 2
+    assert cache.get("second") is None
+    assert cache.get("first") == "1"
+    assert cache.get("third") == "3"
+
+def test_invoke_text_caches_only_accepted_replies(response_cache, monkeypatch):
+    model = stub_model(monkeypatch, 0.7, ["too short", "a reply long enough to keep"])
+    accept = lambda reply: len(reply) > 10
+
+    assert llm_client.invoke_text("prompt", temperature=0.7, cached=True, accept=accept) == "too short"
+    assert response_cache.stats()["size"] == 0
+
+    assert llm_client.invoke_text("prompt", temperature=0.7, cached=True, accept=accept) == "a reply long enough to keep"
+    assert llm_client.invoke_text("prompt", temperature=0.7, cached=True, accept=accept) == "a reply long enough to keep"
+    assert model.calls == 2
+
+def test_cached_replies_failing_accept_are_regenerated(response_cache, monkeypatch):
+    key = LLMResponseCache.cache_key(llm_client.LLM_MODEL, 0.7, "prompt")
+    response_cache.put(key, "stale")
+    model = stub_model(monkeypatch, 0.7, ["a reply long enough to keep"])
+
+    reply = llm_client.invoke_text("prompt", temperature=0.7, cached=True, accept=lambda reply: len(reply) > 10)
+
+    assert reply == "a reply long enough to keep"
+    assert model.calls == 1
+    assert response_cache.get(key) == "a reply long enough to keep"
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from numpy_store import NumpyVectorStore, SNAPSHOT_VECTORS_FILENAME, VECTORS_FILENAME, max_marginal_relevance
+
+TEXTS = [
+    "TCP provides reliable, ordered delivery of a byte stream.",
+    "A subnet mask splits an IP address into network and host parts.",
+    "Photosynthesis converts light energy into chemical energy.",
+]
+
+@pytest.fixture
+def embeddings():
+    return DeterministicFakeEmbedding(size=32)
+
+def build_store(embeddings, directory, snapshot_dtype):
+    store = NumpyVectorStore(embeddings, persist_directory=str(directory), snapshot_dtype=snapshot_dtype)
+    store.add_texts(
+        TEXTS,
+        metadatas=[{"doc_id": "net"}, {"doc_id": "net"}, {"doc_id": "bio"}],
+        ids=["chunk:0", "chunk:1", "chunk:2"],
+    )
+    return store
+
+@pytest.mark.parametrize("snapshot_dtype, vectors_file", [("float32", VECTORS_FILENAME), ("float16", SNAPSHOT_VECTORS_FILENAME)])
+def test_empty_store_add_search_persist_load_delete(embeddings, tmp_path, snapshot_dtype, vectors_file):
+    store = build_store(embeddings, tmp_path, snapshot_dtype)
+    assert store.count() == 3
+    assert store.similarity_search(TEXTS[1], k=1)[0].page_content == TEXTS[1]
+
+    store.persist()
+    assert (tmp_path / vectors_file).exists()
+
+    reopened = NumpyVectorStore.load(str(tmp_path), embeddings, snapshot_dtype=snapshot_dtype)
+    assert isinstance(reopened._matrix, np.memmap) == (snapshot_dtype == "float16")
+    assert reopened.count() == 3
+    docs = reopened.similarity_search(TEXTS[2], k=2, filter={"doc_id": "bio"})
+    assert [doc.page_content for doc in docs] == [TEXTS[2]]
+
+    reopened.delete(where={"doc_id": "net"})
+    assert reopened.get()["ids"] == ["chunk:2"]
+    reopened.persist()
+    assert NumpyVectorStore.load(str(tmp_path), embeddings, snapshot_dtype=snapshot_dtype).count() == 1
+
+def test_store_emptied_by_delete_accepts_new_documents(embeddings, tmp_path):
+    store = build_store(embeddings, tmp_path, "float32")
+    store.delete(ids=["chunk:0", "chunk:1", "chunk:2"])
+    store.persist()
+
+    reopened = NumpyVectorStore.load(str(tmp_path), embeddings)
+    assert reopened.count() == 0
+    assert reopened.similarity_search(TEXTS[0], k=3) == []
+    reopened.add_texts(TEXTS[:1], ids=["chunk:0"])
+    assert reopened.similarity_search(TEXTS[0], k=1)[0].page_content == TEXTS[0]
+
+def test_float16_snapshot_answers_queries_from_the_memory_map(embeddings, tmp_path):
+    build_store(embeddings, tmp_path, "float16").persist()
+
+    reopened = NumpyVectorStore.load(str(tmp_path), embeddings, snapshot_dtype="float16")
+    assert isinstance(reopened._matrix, np.memmap)
+    (hits,) = reopened.search_by_vectors([embeddings.embed_query(TEXTS[0])], k=3)
+    assert reopened.document_at(hits[0][0]).page_content == TEXTS[0]
+    assert hits[0][1] == pytest.approx(1.0, abs=1e-2)
+    assert reopened.vectors_at([row for row, _ in hits]).dtype == np.float32
+    # Searching must not copy the snapshot into memory; writing does
+    assert isinstance(reopened._matrix, np.memmap)
+    reopened.add_texts(["Mitochondria produce ATP."], ids=["chunk:3"])
+    assert not isinstance(reopened._matrix, np.memmap)
+    assert reopened.count() == 4
+
+def test_empty_float16_snapshot_round_trips(embeddings, tmp_path):
+    store = build_store(embeddings, tmp_path, "float16")
+    store.delete(ids=["chunk:0", "chunk:1", "chunk:2"])
+    store.persist()
+
+    reopened = NumpyVectorStore.load(str(tmp_path), embeddings, snapshot_dtype="float16")
+    assert reopened.count() == 0
+    assert reopened.similarity_search(TEXTS[0]) == []
+    reopened.add_texts(TEXTS[:1], ids=["chunk:0"])
+    assert reopened.similarity_search(TEXTS[0], k=1)[0].page_content == TEXTS[0]
+
+@pytest.mark.parametrize("candidates", [[], np.zeros((0, 32)), np.zeros(0)])
+def test_max_marginal_relevance_without_candidates(candidates):
+    assert max_marginal_relevance(np.ones((1, 32)), candidates, k=3) == []
@@ -0,0 +1,75 @@
+"""
+Streaming upload writer.
+Copies a multipart upload to disk in chunks without blocking the event loop,
+hashing and counting bytes as they pass.
+
+Starlette parses (and spools to its own temporary file) the whole multipart
+body before the endpoint runs, so the copy here is the upload's second trip
+to disk, and its size check only protects ``documents/``. Oversized uploads
+are refused before the body is read by ``check_declared_size``, applied to
+the request's Content-Length; a chunked upload without one is only caught
+once it has been received.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from starlette.concurrency import run_in_threadpool
+
+MAX_UPLOAD_BYTES = int(os.environ.get("EDUFY_MAX_UPLOAD_MB", "50")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds ``MAX_UPLOAD_BYTES``."""
+
+def check_declared_size(content_length, max_bytes=MAX_UPLOAD_BYTES):
+    """Raise UploadTooLargeError if a request's Content-Length cannot fit within ``max_bytes``."""
+    try:
+        declared_size = int(content_length)
+    except (TypeError, ValueError):
+        return
+    if declared_size > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise UploadTooLargeError(f"Upload is {declared_size} bytes; the limit is {max_bytes} bytes")
+
+async def save_upload_stream(upload_file, destination_dir, filename, max_bytes=MAX_UPLOAD_BYTES):
+    """Stream ``upload_file`` into ``destination_dir/filename``.
+
+    The body is written to a temporary file in the destination directory and
+    atomically renamed into place only once it is complete, so readers never
+    see a half-written document.
+
+    Returns ``(file_path, file_size, sha256_hex)``. Empty uploads are discarded
+    and reported with ``file_path`` set to None.
+    """
+    os.makedirs(destination_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=destination_dir, prefix=".upload-", suffix=".part")
+    digest = hashlib.sha256()
+    file_size = 0
+
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while True:
+                chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                file_size += len(chunk)
+                if file_size > max_bytes:
+                    raise UploadTooLargeError(f"File exceeds the {max_bytes} byte upload limit")
+                digest.update(chunk)
+                await run_in_threadpool(buffer.write, chunk)
+
+        if file_size == 0:
+            os.remove(temp_path)
+            return None, 0, digest.hexdigest()
+
+        file_path = os.path.join(destination_dir, filename)
+        os.replace(temp_path, file_path)
+        return file_path, file_size, digest.hexdigest()
+
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -2,12 +2,25 @@ import axios from "axios";
 
 const API_URL = "http://127.0.0.1:8000"; // FastAPI backend
 
+// Each browser gets its own backend session so students don't share documents
+const getSessionId = () => {
+  let sessionId = localStorage.getItem("edufySessionId");
+  if (!sessionId) {
+    sessionId = `s-${Date.now().toString(36)}-${Math.random()
+      .toString(36)
+      .slice(2, 10)}`;
+    localStorage.setItem("edufySessionId", sessionId);
+  }
+  return sessionId;
+};
+
 // Create axios instance with default config
-const api = axios.create({
+export const api = axios.create({
   baseURL: API_URL,
   timeout: 30000, // 30 seconds timeout
   headers: {
     "Content-Type": "application/json",
+    "X-Session-Id": getSessionId(),
   },
 });
 
@@ -48,17 +61,53 @@ api.interceptors.response.use(
   }
 );
 
-export const uploadFile = async (file) => {
+export const getJob = async (jobId) => {
+  const response = await api.get(`/jobs/${jobId}`);
+  return response.data;
+};
+
+// Upload a file, then poll its background ingestion job until it finishes.
+// onProgress (optional) receives each job snapshot ({ stage, percent, ... }).
+export const uploadFile = async (file, onProgress) => {
   const formData = new FormData();
   formData.append("file", file);
 
-  const response = await api.post("/upload", formData, {
-    headers: {
-      "Content-Type": "multipart/form-data",
-    },
-  });
+  let response;
+  try {
+    response = await api.post("/upload", formData, {
+      headers: {
+        "Content-Type": "multipart/form-data",
+      },
+    });
+  } catch (error) {
+    // Oversized files are refused (413) before the upload is read
+    if (error.response?.status === 413 && error.response.data?.error) {
+      return error.response.data;
+    }
+    throw error;
+  }
 
-  return response.data;
+  if (response.data.error || !response.data.job_id) {
+    return response.data;
+  }
+
+  for (;;) {
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    const job = await getJob(response.data.job_id);
+
+    if (job.error && !job.status) {
+      return job;
+    }
+    if (onProgress) {
+      onProgress(job);
+    }
+    if (job.status === "completed") {
+      return job.result;
+    }
+    if (job.status === "failed") {
+      return { error: job.error || "Document processing failed." };
+    }
+  }
 };
 
 export const askQuestion = async (question) => {
@@ -69,11 +118,89 @@ export const askQuestion = async (question) => {
   return response.data;
 };
 
-export const getSampleQuestions = async () => {
-  const response = await api.get("/sample-questions");
-  return response.data;
+// Ask over Server-Sent Events: the sources arrive as soon as retrieval is done,
+// then the answer streams in piece by piece. Resolves with the final response.
+// Uses fetch rather than EventSource, which cannot send the session header.
+export const streamQuestion = async (question, { onSources, onToken } = {}) => {
+  const params = new URLSearchParams({ question });
+  const response = await fetch(`${API_URL}/query/stream?${params}`, {
+    headers: { "X-Session-Id": getSessionId() },
+  });
+
+  if (!response.ok) {
+    throw new Error("Server error. Please try again later.");
+  }
+  // Errors such as "no documents uploaded" come back as plain JSON
+  if (!response.headers.get("content-type")?.includes("text/event-stream")) {
+    return response.json();
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let result = null;
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const message = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = "message";
+      const data = [];
+      for (const line of message.split("\n")) {
+        if (line.startsWith("event:")) {
+          event = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+          data.push(line.slice(5).trim());
+        }
+      }
+      if (!data.length) {
+        continue;
+      }
+
+      const payload = JSON.parse(data.join("\n"));
+      if (event === "sources" && onSources) {
+        onSources(payload);
+      } else if (event === "token" && onToken) {
+        onToken(payload.text);
+      } else if (event === "done") {
+        result = payload;
+      }
+    }
+  }
+
+  return result || { error: "The answer stream ended unexpectedly." };
+};
+
+// Flashcards and sample questions are prepared in the background. While the
+// backend answers { status: "generating" }, pass its message to onGenerating
+// (optional) and ask again, up to about two minutes.
+const getStudyMaterial = async (path, onGenerating) => {
+  for (let attempt = 0; ; attempt++) {
+    const response = await api.get(path);
+    if (response.data.status !== "generating" || attempt >= 60) {
+      return response.data;
+    }
+    if (onGenerating) {
+      onGenerating(response.data.message);
+    }
+    await new Promise((resolve) => setTimeout(resolve, 2000));
+  }
 };
 
+export const getFlashcards = (onGenerating) =>
+  getStudyMaterial("/flashcards", onGenerating);
+
+export const getSampleQuestions = (onGenerating) =>
+  getStudyMaterial("/sample-questions", onGenerating);
+
 export const getStatus = async () => {
   const response = await api.get("/status");
   return response.data;
@@ -1,6 +1,5 @@
 import React, { useState, useRef, useEffect } from "react";
-import { getStatus } from "../api";
-import axios from "axios";
+import { getFlashcards, getStatus } from "../api";
 import FlashcardViewer from "./FlashcardViewer";
 
 const FlashcardButton = ({
@@ -41,17 +40,26 @@ const FlashcardButton = ({
         return;
       }
 
-      // Call the real flashcards API
-      const response = await axios.get("http://127.0.0.1:8000/flashcards");
+      // Call the real flashcards API; it may still be preparing them
+      const data = await getFlashcards(setStatusMessage);
 
-      if (response.data.error) {
+      if (data.error) {
         setStatusType("error");
-        setStatusMessage(response.data.error);
+        setStatusMessage(data.error);
         setIsGenerating(false);
         return;
       }
 
-      const generatedFlashcards = response.data.flashcards || [];
+      if (data.status === "generating") {
+        setStatusType("info");
+        setStatusMessage(
+          "Flashcards are still being prepared. Please try again in a moment."
+        );
+        setIsGenerating(false);
+        return;
+      }
+
+      const generatedFlashcards = data.flashcards || [];
 
       if (generatedFlashcards.length === 0) {
         setStatusType("error");
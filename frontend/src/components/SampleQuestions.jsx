@@ -1,14 +1,21 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { getSampleQuestions, getStatus } from "../api";
 
 const SampleQuestions = ({ onQuestionClick }) => {
   const [hasDocuments, setHasDocuments] = useState(false);
   const [questions, setQuestions] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
+  const [loadingMessage, setLoadingMessage] = useState("");
+  const isFetching = useRef(false);
 
   useEffect(() => {
     // Check if documents are uploaded and fetch sample questions
     const checkDocumentsAndFetchQuestions = async () => {
+      // A fetch may still be waiting for the questions to be prepared
+      if (isFetching.current) {
+        return;
+      }
+      isFetching.current = true;
       try {
         const statusResponse = await getStatus();
         const hasUploaded = statusResponse.database_ready && statusResponse.documents.length > 0;
@@ -16,9 +23,14 @@ const SampleQuestions = ({ onQuestionClick }) => {
 
         if (hasUploaded) {
           setIsLoading(true);
+          let stillGenerating = false;
           try {
-            const questionsResponse = await getSampleQuestions();
-            if (questionsResponse.questions && !questionsResponse.error) {
+            const questionsResponse = await getSampleQuestions(setLoadingMessage);
+            if (questionsResponse.status === "generating") {
+              // Still not ready: keep showing progress; the next check asks again
+              stillGenerating = true;
+              setLoadingMessage(questionsResponse.message);
+            } else if (questionsResponse.questions && !questionsResponse.error) {
               setQuestions(questionsResponse.questions);
             } else {
               setQuestions([]);
@@ -27,7 +39,10 @@ const SampleQuestions = ({ onQuestionClick }) => {
             console.error('Error fetching sample questions:', error);
             setQuestions([]);
           } finally {
-            setIsLoading(false);
+            if (!stillGenerating) {
+              setIsLoading(false);
+              setLoadingMessage("");
+            }
           }
         } else {
           setQuestions([]);
@@ -36,6 +51,8 @@ const SampleQuestions = ({ onQuestionClick }) => {
         console.error('Error checking document status:', error);
         setHasDocuments(false);
         setQuestions([]);
+      } finally {
+        isFetching.current = false;
       }
     };
 
@@ -72,7 +89,7 @@ const SampleQuestions = ({ onQuestionClick }) => {
         </h3>
         <div className="flex justify-center items-center space-x-2">
           <div className="animate-spin rounded-full h-6 w-6 border-b-2 border-blue-600"></div>
-          <span className="text-gray-600">Generating smart questions from your content</span>
+          <span className="text-gray-600">{loadingMessage || "Generating smart questions from your content"}</span>
         </div>
       </div>
     );
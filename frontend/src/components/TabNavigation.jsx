@@ -1,8 +1,7 @@
 import React, { useState, useEffect } from "react";
 import Query from "./query";
 import FlashcardViewer from "./FlashcardViewer";
-import { getStatus } from "../api";
-import axios from "axios";
+import { getFlashcards, getStatus } from "../api";
 
 const TabNavigation = ({ selectedQuestion, onQuestionChange }) => {
   const [activeTab, setActiveTab] = useState("query");
@@ -44,19 +43,29 @@ const TabNavigation = ({ selectedQuestion, onQuestionChange }) => {
         return;
       }
 
-      // STEP 2: Call backend API to generate flashcards
-      const response = await axios.get("http://127.0.0.1:8000/flashcards");
+      // STEP 2: Call backend API for the flashcards, waiting while they are prepared
+      const data = await getFlashcards(setStatusMessage);
 
       // Handle API errors
-      if (response.data.error) {
+      if (data.error) {
         setStatusType("error");
-        setStatusMessage(response.data.error);
+        setStatusMessage(data.error);
+        setIsGenerating(false);
+        return;
+      }
+
+      // Still preparing after waiting: let the user retry later
+      if (data.status === "generating") {
+        setStatusType("info");
+        setStatusMessage(
+          "Flashcards are still being prepared. Please try again in a moment."
+        );
         setIsGenerating(false);
         return;
       }
 
       // STEP 3: Process the generated flashcards
-      const generatedFlashcards = response.data.flashcards || [];
+      const generatedFlashcards = data.flashcards || [];
 
       // Validate that flashcards were actually generated
       if (generatedFlashcards.length === 0) {
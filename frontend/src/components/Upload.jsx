@@ -21,7 +21,13 @@ const Upload = () => {
     setMessage("🔄 Uploading and processing your document...");
 
     try {
-      const res = await uploadFile(file);
+      const res = await uploadFile(file, (job) => {
+        setMessage(
+          `🔄 Processing your document... ${job.stage} (${Math.round(
+            job.percent
+          )}%)`
+        );
+      });
 
       if (res.error) {
         setMessage(`❌ ${res.error}`);
@@ -35,8 +41,8 @@ const Upload = () => {
                 ? Math.round(res.file_size / 1024) + " KB"
                 : "Unknown"
             }\n\n` +
-            `🔄 Previous documents have been completely removed.\n` +
-            `💭 New smart questions and flashcards will be generated for your new document.`
+            `📚 The document was added to your library.\n` +
+            `💭 Smart questions and flashcards will now include its content.`
         );
 
         setFile(null);
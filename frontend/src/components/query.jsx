@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from "react";
-import { askQuestion } from "../api";
+import { streamQuestion } from "../api";
 
 const Query = ({ selectedQuestion, onQuestionChange }) => {
   const [question, setQuestion] = useState("");
@@ -29,15 +29,28 @@ const Query = ({ selectedQuestion, onQuestionChange }) => {
     setHasSearched(true);
     setShowSources(false); // Reset sources dropdown for new query
 
-    try {
-      const res = await askQuestion(question);
+    const showResponse = (res) => {
       setAnswers(res.answers || []);
-      setAiResponse(res.ai_response || "");
       setQueryMetadata({
         queryType: res.query_type || "general",
         kUsed: res.k_used || 0,
         totalSections: res.total_sections || 0,
       });
+    };
+
+    setAiResponse("");
+
+    try {
+      // Sources show up once retrieval is done; the answer then streams in
+      const res = await streamQuestion(question, {
+        onSources: (sources) => {
+          showResponse(sources);
+          setIsLoading(false);
+        },
+        onToken: (text) => setAiResponse((current) => current + text),
+      });
+      showResponse(res);
+      setAiResponse(res.ai_response || "");
     } catch (err) {
       console.error(err);
       setAnswers([]);